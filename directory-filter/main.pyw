@@ -2,7 +2,7 @@ import os
 import re
 import shutil
 import tkinter as tk
-from typing import List
+from typing import Iterator, List
 
 
 def filter_paths_by_filetype(paths: List[str], file_types: str) -> List[str]:
@@ -70,6 +70,28 @@ def copy_file_to_destination(file_names: List[str]) -> None:
             print(f"Skipped {source_file_path}")
 
 
+def scan_directory(path: str) -> Iterator[os.DirEntry]:
+    """Yield the files and empty folders below a directory using os.scandir."""
+    try:
+        with os.scandir(path) as iterator:
+            entries = list(iterator)
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                with os.scandir(entry.path) as iterator:
+                    is_empty = next(iterator, None) is None
+                if is_empty:
+                    yield entry
+                else:
+                    yield from scan_directory(entry.path)
+            elif entry.is_file():
+                yield entry
+        except OSError:
+            continue
+
+
 def index_directory(source_path: str) -> List[str]:
     """Get the list of all paths found in the user-specified directory."""
 
@@ -77,15 +99,14 @@ def index_directory(source_path: str) -> List[str]:
     paths = []
     path_len = len(source_path)
 
-    # Walk through the directory and collect paths
-    for subdir, dirs, files in os.walk(source_path):
-        # Handle empty directories
-        if not dirs and not files and subdir != source_path:
-            paths.append(subdir[path_len:] + os.sep)
-
-        # Collect file paths
-        for file in files:
-            paths.append(os.path.join(subdir[path_len:], file))
+    # Stream files and empty folders as the directory is scanned
+    for entry in scan_directory(source_path):
+        if entry.is_dir():
+            paths.append(entry.path[path_len:] + os.sep)
+        else:
+            paths.append(
+                os.path.join(os.path.dirname(entry.path)[path_len:], entry.name)
+            )
 
     # Sort paths and print the count
     paths.sort(key=str.casefold)
@@ -0,0 +1,295 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import core
+import instrumentation
+import pipeline
+
+
+class PrintStatusField:
+    def setText(self, text):
+        print(text)
+
+
+def add_layout_arguments(parser):
+    parser.add_argument(
+        "--layout",
+        dest="layouts",
+        action="append",
+        choices=core.STITCH_LAYOUTS,
+        help="may be repeated; defaults to vertical and horizontal",
+    )
+    parser.add_argument("--columns", type=int, help="columns for the grid layout")
+    parser.add_argument("--spacing", type=int, help="gap between pages or images")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m cli", description="Run PDF and Image Tools operations."
+    )
+    parser.add_argument("--workers", type=int, help="process pool size")
+    parser.add_argument(
+        "--no-incremental",
+        action="store_true",
+        help="reprocess inputs even if the run manifest says they are unchanged",
+    )
+    parser.add_argument(
+        "--memory-cache",
+        type=int,
+        metavar="MB",
+        help=f"in-memory page cache size (default {core.page_cache_memory_mb})",
+    )
+    parser.add_argument(
+        "--disk-cache",
+        type=int,
+        metavar="MB",
+        help=f"on-disk page cache size (default {core.page_cache_disk_mb})",
+    )
+    parser.add_argument("--events", help="append JSON Lines timing events to this file")
+    parser.add_argument(
+        "--profile", help="write a cProfile dump per run to this folder"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, func, help_text):
+        subparser = commands.add_parser(name, help=help_text)
+        subparser.add_argument("directory")
+        subparser.set_defaults(func=func)
+        return subparser
+
+    subparser = command(
+        "merge-pdfs",
+        lambda args: core.merge_pdfs(args.directory, args.pages, args.megabytes),
+        "merge all PDFs into one file",
+    )
+    subparser.add_argument("--pages", type=int, help="maximum pages per output part")
+    subparser.add_argument("--megabytes", type=int, help="maximum size per output part")
+
+    subparser = command(
+        "stitch-pdfs",
+        lambda args: core.stitch_pdfs(
+            args.directory, args.layouts, args.columns, args.spacing, args.combined
+        ),
+        "stitch all pages of each PDF onto one page",
+    )
+    add_layout_arguments(subparser)
+    subparser.add_argument("--combined", action="store_true")
+
+    subparser = command(
+        "encrypt-pdf",
+        lambda args: core.encrypt_pdf(args.directory, args.password),
+        "encrypt PDFs with a password",
+    )
+    subparser.add_argument("--password", required=True)
+
+    subparser = command(
+        "save-page-range",
+        lambda args: core.save_page_range(args.directory, ranges=args.ranges),
+        "extract page ranges from each PDF",
+    )
+    subparser.add_argument(
+        "ranges", help="e.g. '1-3,7,10-', 'every 10', 'bookmarks', 'search:invoice'"
+    )
+
+    command(
+        "index-text",
+        lambda args: core.index_pdf_text(args.directory),
+        "index the text of each PDF page for searching",
+    )
+
+    subparser = command(
+        "search",
+        lambda args: core.search_pdfs(args.directory, args.query),
+        "list PDFs and pages that match a full-text query",
+    )
+    subparser.add_argument("query", help='words, "a phrase", or FTS5 syntax')
+
+    subparser = command(
+        "pdf-to-image",
+        lambda args: core.pdf_to_image(
+            args.directory, args.dpi, args.format, args.grayscale
+        ),
+        "render PDF pages to images",
+    )
+    subparser.add_argument("--dpi", type=int)
+    subparser.add_argument("--format", choices=["png", "jpeg", "tiff"])
+    subparser.add_argument("--grayscale", action="store_true", default=None)
+
+    subparser = command(
+        "enhance-contrast",
+        lambda args: core.enhance_contrast(args.directory, args.factor, args.quality),
+        "increase the contrast of PDFs",
+    )
+    subparser.add_argument("--factor", type=float)
+    subparser.add_argument("--quality", type=int, default=90)
+
+    command(
+        "crop-images",
+        lambda args: core.crop_images(args.directory),
+        "crop images with predefined dimensions",
+    )
+
+    subparser = command(
+        "merge-images",
+        lambda args: core.merge_images(
+            args.directory, args.layouts, args.columns, args.spacing, args.formats
+        ),
+        "merge all images into one",
+    )
+    add_layout_arguments(subparser)
+    subparser.add_argument("--formats", nargs="+", default=["png", "jpg"])
+
+    command(
+        "convert-png-jpg",
+        lambda args: core.convert_between_png_jpg(args.directory),
+        "convert PNG to JPG and JPG to PNG",
+    )
+    command(
+        "img-to-ico",
+        lambda args: core.img_to_ico(args.directory),
+        "convert images to ICO",
+    )
+
+    subparser = command(
+        "image-to-pdf",
+        lambda args: core.image_to_pdf(
+            args.directory, args.single, args.page_size, args.fit
+        ),
+        "convert images to PDF",
+    )
+    subparser.add_argument("--single", action="store_true", default=None)
+    subparser.add_argument("--page-size", choices=list(core.PAGE_SIZES_MM))
+    subparser.add_argument(
+        "--fit", choices=["into", "fill", "exact", "shrink", "enlarge"]
+    )
+
+    subparser = command(
+        "image-colors",
+        lambda args: core.get_image_colors(
+            args.directory, args.max_pixels, args.palette, not args.no_export
+        ),
+        "report average, common and palette colors",
+    )
+    subparser.add_argument("--max-pixels", type=int)
+    subparser.add_argument("--palette", type=int, default=0)
+    subparser.add_argument("--no-export", action="store_true")
+
+    command(
+        "crop-by-90",
+        lambda args: core.crop_by_90(args.directory),
+        "crop images to 90%% of their size",
+    )
+
+    subparser = command(
+        "svg-webp-to-png",
+        lambda args: core.convert_svg_and_webp_to_png(
+            args.directory, args.scale, args.renderers, args.width
+        ),
+        "convert SVG and WebP files to PNG",
+    )
+    subparser.add_argument("--scale", type=float)
+    subparser.add_argument(
+        "--renderers", type=int, help=f"browser pages (default {core.SVG_RENDERERS})"
+    )
+    subparser.add_argument("--width", type=int, help="output width in pixels")
+
+    subparser = command(
+        "crop-solid-edges",
+        lambda args: core.crop_solid_edges(args.directory, args.tolerance),
+        "trim solid-colored borders from images",
+    )
+    subparser.add_argument("--tolerance", type=int)
+
+    subparser = command(
+        "resave",
+        lambda args: core.resave_files(
+            args.directory, False, args.quality, args.max_dpi
+        ),
+        "optimize and strip metadata in place",
+    )
+    subparser.add_argument("--quality", type=int)
+    subparser.add_argument("--max-dpi", type=int)
+
+    command(
+        "sanitize",
+        lambda args: core.sanitize(args.directory),
+        "strip metadata and use generic file names",
+    )
+
+    subparser = command(
+        "print-info",
+        lambda args: core.print_info(args.directory, not args.no_export),
+        "export image and PDF metadata",
+    )
+    subparser.add_argument("--no-export", action="store_true")
+
+    subparser = command(
+        "rename-files",
+        lambda args: core.rename_files(args.directory, args.name),
+        "rename files with a base name and sequential numbers",
+    )
+    subparser.add_argument("--name", required=True)
+
+    command(
+        "duplicates",
+        lambda args: core.duplicate_detector(args.directory),
+        "find byte-identical files",
+    )
+
+    subparser = command(
+        "near-duplicates",
+        lambda args: core.near_duplicate_detector(
+            args.directory, args.threshold, args.method
+        ),
+        "find visually similar images",
+    )
+    subparser.add_argument("--threshold", type=int)
+    subparser.add_argument(
+        "--method", choices=["ahash", "dhash", "phash"], default="dhash"
+    )
+
+    subparser = command(
+        "pipeline",
+        lambda args: pipeline.run_pipeline(args.directory, args.steps),
+        "chain steps in memory and write only the final output",
+    )
+    subparser.add_argument(
+        "steps",
+        help="a JSON config file or steps like "
+        "'render dpi=300 | crop_solid_edges | pdf'",
+    )
+
+    command(
+        "resume",
+        lambda args: core.resume_job(args.directory),
+        "continue the interrupted job in a directory",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    core.status_field = PrintStatusField()
+    if args.workers:
+        core.max_workers = args.workers
+    if args.no_incremental:
+        core.incremental = False
+    if args.memory_cache is not None:
+        core.page_cache_memory_mb = args.memory_cache
+    if args.disk_cache is not None:
+        core.page_cache_disk_mb = args.disk_cache
+    instrumentation.log_path = args.events
+    instrumentation.profile_dir = args.profile
+    if not os.path.isdir(args.directory):
+        print(f"Not a directory: {args.directory}", file=sys.stderr)
+        return 2
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
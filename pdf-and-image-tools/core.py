@@ -1,32 +1,64 @@
 import collections
+import concurrent.futures
+import contextlib
+import csv
+import functools
 import hashlib
+import importlib
+import importlib.util
+import inspect
 import io
+import itertools
+import json
+import multiprocessing
+import multiprocessing.util
 import os
 import re
 import shutil
+import sqlite3
 import sys
+import tempfile
+import threading
 
-try:
-    import cairosvg
-except (ModuleNotFoundError, OSError):
-    cairosvg = None
+import indexer
+import instrumentation
 
-try:
-    import img2pdf
-except ModuleNotFoundError:
-    img2pdf = None
 
-try:
-    import playwright.sync_api
-except ModuleNotFoundError:
-    playwright = None
+class LazyModule:
+    def __init__(self, name):
+        self.name = name
 
-import numpy
-import pdf2image
-import PIL.ExifTags
-import PIL.Image
-import PIL.ImageEnhance
-import pypdf
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.name)
+        try:
+            value = getattr(module, attr)
+        except AttributeError:
+            value = importlib.import_module(f"{self.name}.{attr}")
+        setattr(self, attr, value)
+        return value
+
+
+def optional_module(name):
+    return LazyModule(name) if importlib.util.find_spec(name) else None
+
+
+@functools.cache
+def get_cairosvg():
+    # cairosvg loads the native cairo library on import, which fails with OSError
+    # when the package is installed without it
+    try:
+        import cairosvg
+    except (ImportError, OSError):
+        return None
+    return cairosvg
+
+
+img2pdf = optional_module("img2pdf")
+playwright = optional_module("playwright")
+numpy = LazyModule("numpy")
+pdf2image = LazyModule("pdf2image")
+PIL = LazyModule("PIL")
+pypdf = LazyModule("pypdf")
 
 
 class DummyStatusField:
@@ -36,6 +68,62 @@ class DummyStatusField:
 
 status_field = DummyStatusField()
 input_text = ""
+svg_renderer = None
+max_workers = os.cpu_count() or 1
+cancel_event = threading.Event()
+RENDER_CHUNK_PAGES = 16
+PAGE_EXTENSIONS = {"jpeg": ".jpg", "tiff": ".tif"}
+IMAGE_PDF_CHUNK_FILES = 32
+SVG_RENDERERS = 4
+STITCH_LAYOUTS = ("vertical", "horizontal", "grid")
+PAGE_SIZES_MM = {
+    "a3": (297, 420),
+    "a4": (210, 297),
+    "a5": (148, 210),
+    "letter": (215.9, 279.4),
+    "legal": (215.9, 355.6),
+}
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-and-image-tools")
+HASH_CACHE_PATH = os.path.join(CACHE_DIR, "hashes.sqlite3")
+PAGE_CACHE_DIR = os.path.join(CACHE_DIR, "pages")
+page_cache_memory_mb = 128
+page_cache_disk_mb = 0
+WORKER_SETTINGS = ("page_cache_memory_mb", "page_cache_disk_mb", "PAGE_CACHE_DIR")
+page_cache = collections.OrderedDict()
+page_cache_bytes = 0
+page_cache_lock = threading.Lock()
+HASH_THREADS = min(32, (os.cpu_count() or 1) * 2)
+HASH_CHUNK_BYTES = 1024 * 1024
+PARTIAL_HASH_BYTES = 4096
+CONTROL_PREFIX = ".pdf_img_tools_"
+MANIFEST_NAME = f"{CONTROL_PREFIX}manifest.json"
+JOURNAL_NAME = f"{CONTROL_PREFIX}journal.jsonl"
+JOB_NAME = f"{CONTROL_PREFIX}job.json"
+SEARCH_INDEX_NAME = f"{CONTROL_PREFIX}search.sqlite3"
+RESUMABLE_OPERATIONS = {
+    "core": (
+        "stitch_pdfs",
+        "save_page_range",
+        "resave_files",
+        "pdf_to_image",
+        "image_to_pdf",
+        "crop_images",
+        "convert_between_png_jpg",
+        "img_to_ico",
+        "crop_by_90",
+        "enhance_contrast",
+        "crop_solid_edges",
+    ),
+    "pipeline": ("run_pipeline",),
+}
+incremental = True
+manifest_hashes = False
+
+CROP_CONFIGS = {
+    (1280, 1080): [(0, 0, 1280, 720)],
+    (2560, 720): [(0, 0, 1280, 720), (1280, 0, 2560, 720)],
+    (3200, 1080): [(0, 0, 1920, 1080), (1920, 0, 3200, 1080)],
+}
 
 
 def ensure_folder(source_path):
@@ -46,357 +134,1154 @@ def ensure_folder(source_path):
     return source_path
 
 
-def merge_pdfs(dir_path):
-    writer = pypdf.PdfWriter()
-    pdf_files = index_directory(dir_path, "pdf")
+@instrumentation.operation
+def merge_pdfs(dir_path, pages_per_part=None, megabytes_per_part=None):
+    if pages_per_part is None and megabytes_per_part is None:
+        pages_per_part, megabytes_per_part = get_part_limits()
+    manifest = RunManifest(dir_path, "merge_pdfs", (pages_per_part, megabytes_per_part))
+    pdf_files = list(
+        manifest.select(iter_directory(dir_path, "pdf"), "_merged_", False)
+    )
     if not pdf_files:
         if status_field:
             status_field.setText("No PDF files found to merge.")
         return
+    if incremental and not any(manifest.select(pdf_files)) and not manifest.is_stale():
+        if status_field:
+            status_field.setText("No changed PDF files to merge.")
+        return
+    manifest.start_job()
+    split_output = bool(pages_per_part or megabytes_per_part)
+    max_part_bytes = (megabytes_per_part or 0) * 1024 * 1024
+    base_name = strip_ext(get_file_name(pdf_files[0]))
+    result_paths = []
+    try:
+        for part in get_merge_parts(pdf_files, pages_per_part, max_part_bytes):
+            if split_output:
+                part_number = str(len(result_paths) + 1).zfill(2)
+                file_name = f"_merged_{base_name}_part{part_number}.pdf"
+            else:
+                file_name = f"_merged_{get_file_name(pdf_files[0])}"
+            result_pdf_path = os.path.join(dir_path, file_name)
+            with (
+                atomic_output(result_pdf_path) as temp_path,
+                open(temp_path, "wb") as output_file,
+            ):
+                writer = StreamingPdfWriter(output_file)
+                for pdf_file, first_page, last_page in part:
+                    if cancel_event.is_set():
+                        raise InterruptedError
+                    with open(pdf_file, "rb") as pdf_in:
+                        reader = pypdf.PdfReader(pdf_in)
+                        pages = [reader.pages[i] for i in range(first_page, last_page)]
+                        with instrumentation.phase("write"):
+                            writer.append_pages(reader, pages)
+                with instrumentation.phase("write"):
+                    writer.close()
+            result_paths.append(result_pdf_path)
+    except InterruptedError:
+        if status_field:
+            status_field.setText("Merge cancelled.")
+        return
+    manifest.reset()
     for pdf_file in pdf_files:
-        reader = pypdf.PdfReader(pdf_file)
-        for page in range(len(reader.pages)):
-            writer.add_page(reader.pages[page])
-    result_pdf_path = os.path.join(dir_path, f"_merged_{get_file_name(pdf_files[0])}")
-    with open(result_pdf_path, "wb") as output_pdf:
-        writer.write(output_pdf)
+        manifest.record(pdf_file, result_paths)
+    manifest.save()
     if status_field:
-        status_field.setText(f"\nMerge PDF Result: {result_pdf_path}")
-
+        status_field.setText(
+            "\n".join(f"Merge PDF Result: {path}" for path in result_paths)
+        )
 
-def stitch_pdfs(dir_path):
-    for file_name in index_directory(dir_path, "pdf"):
-        with open(file_name, "rb") as pdf_in:
-            pdf_file = pypdf.PdfReader(pdf_in)
-            if len(pdf_file.pages) < 2:
-                if status_field:
-                    status_field.setText(f"Skipping {file_name}: less than 2 pages.")
-                continue
-            max_width = max_height = total_width = total_height = 0
-            pages = []
-            for page in pdf_file.pages:
-                pages.append(page)
-                width, height = page.mediabox.width, page.mediabox.height
-                total_width += width
-                total_height += height
-                max_width = max(max_width, width)
-                max_height = max(max_height, height)
-
-            vertical_pdf = pypdf.PageObject.create_blank_page(
-                width=max_width, height=total_height
-            )
-            for i, page in enumerate(pages):
-                vertical_pdf.merge_page(page, expand=True)
-                if i != len(pages) - 1:
-                    vertical_pdf.add_transformation(
-                        pypdf.Transformation().translate(ty=page.mediabox.height)
-                    )
-            output = pypdf.PdfWriter()
-            output.add_page(vertical_pdf)
-            vertical_path = os.path.join(
-                get_folder_path(file_name),
-                f"_v_stitch_{strip_ext(get_file_name(file_name))}.pdf",
-            )
-            with open(vertical_path, "wb") as vertical_out:
-                output.write(vertical_out)
-            if status_field:
-                status_field.setText(f"Created vertical stitched PDF: {vertical_path}")
 
-            horizontal_pdf = pypdf.PageObject.create_blank_page(
-                width=total_width, height=max_height
-            )
-            for i, page in enumerate(pages[::-1]):
-                horizontal_pdf.merge_page(page, expand=True)
-                if i != len(pages) - 1:
-                    horizontal_pdf.add_transformation(
-                        pypdf.Transformation().translate(tx=page.mediabox.width)
-                    )
-            output = pypdf.PdfWriter()
-            output.add_page(horizontal_pdf)
-            horizontal_path = os.path.join(
-                get_folder_path(file_name),
-                f"_h_stitch_{strip_ext(get_file_name(file_name))}.pdf",
+def get_merge_parts(pdf_files, pages_per_part=None, max_part_bytes=0):
+    # Yields each output part as (file, first page, end page) ranges; part sizes
+    # are estimated from the size of the input file per page
+    part, part_pages, part_bytes = [], 0, 0
+    for pdf_file in pdf_files:
+        with open(pdf_file, "rb") as pdf_in:
+            page_count = len(pypdf.PdfReader(pdf_in).pages)
+        page_bytes = os.path.getsize(pdf_file) / max(1, page_count)
+        first_page = 0
+        for page_index in range(page_count):
+            part_full = (pages_per_part and part_pages >= pages_per_part) or (
+                max_part_bytes and part_bytes + page_bytes > max_part_bytes
             )
-            with open(horizontal_path, "wb") as horizontal_out:
-                output.write(horizontal_out)
-            if status_field:
-                status_field.setText(
-                    f"Created horizontal stitched PDF: {horizontal_path}"
-                )
+            if part_pages and part_full:
+                if page_index > first_page:
+                    part.append((pdf_file, first_page, page_index))
+                yield part
+                part, part_pages, part_bytes = [], 0, 0
+                first_page = page_index
+            part_pages += 1
+            part_bytes += page_bytes
+        part.append((pdf_file, first_page, page_count))
+    yield part
+
+
+def get_part_limits():
+    match = re.fullmatch(r"\s*(\d+)\s*(p|pages|mb)\s*", str(input_text), re.I)
+    if not match:
+        return None, None
+    if match.group(2).lower() == "mb":
+        return None, int(match.group(1))
+    return int(match.group(1)), None
+
+
+@instrumentation.operation
+def stitch_pdfs(dir_path, layouts=None, columns=None, spacing=None, combined=False):
+    options = get_layout_options()
+    layouts = layouts or options["layouts"]
+    columns = columns or options["columns"]
+    spacing = options["spacing"] if spacing is None else spacing
+    results, skipped = process_changed_files(
+        "stitch_pdfs",
+        dir_path,
+        ("_v_stitch_", "_h_stitch_", "_g_stitch_", "_stitch_"),
+        stitch_pdf_file,
+        iter_directory(dir_path, "pdf"),
+        tuple(layouts),
+        columns,
+        spacing,
+        combined,
+    )
+    report_results(results, skipped=skipped)
+
+
+def stitch_pdf_file(
+    file_name, layouts=("vertical", "horizontal"), columns=2, spacing=0, combined=False
+):
+    with open(file_name, "rb") as pdf_in:
+        reader = pypdf.PdfReader(pdf_in)
+        if len(reader.pages) < 2:
+            return f"Skipping {file_name}: less than 2 pages."
+        base_name = strip_ext(get_file_name(file_name))
+        writers = []
+        if combined:
+            writer = pypdf.PdfWriter()
+            xobjects = [page_to_xobject(writer, page) for page in reader.pages]
+            for layout in layouts:
+                add_stitched_page(writer, xobjects, layout, columns, spacing)
+            writers.append((writer, f"_stitch_{base_name}.pdf"))
+        else:
+            for layout in layouts:
+                writer = pypdf.PdfWriter()
+                xobjects = [page_to_xobject(writer, page) for page in reader.pages]
+                add_stitched_page(writer, xobjects, layout, columns, spacing)
+                writers.append((writer, f"_{layout[0]}_stitch_{base_name}.pdf"))
+        output_paths = []
+        for writer, output_name in writers:
+            output_path = os.path.join(get_folder_path(file_name), output_name)
+            with (
+                instrumentation.phase("write"),
+                atomic_output(output_path) as temp_path,
+            ):
+                writer.write(temp_path)
+            output_paths.append(output_path)
+    return output_paths
+
+
+def page_to_xobject(writer, page):
+    box = page.mediabox
+    form = pypdf.generic.DecodedStreamObject()
+    contents = page.get_contents()
+    form.set_data(contents.get_data() if contents is not None else b"")
+    form.update(
+        {
+            pypdf.generic.NameObject("/Type"): pypdf.generic.NameObject("/XObject"),
+            pypdf.generic.NameObject("/Subtype"): pypdf.generic.NameObject("/Form"),
+            pypdf.generic.NameObject("/BBox"): pypdf.generic.ArrayObject(
+                pypdf.generic.FloatObject(value)
+                for value in (box.left, box.bottom, box.right, box.top)
+            ),
+        }
+    )
+    resources = page.raw_get("/Resources") if "/Resources" in page else None
+    if resources is not None:
+        form[pypdf.generic.NameObject("/Resources")] = resources.clone(writer)
+    return (
+        writer._add_object(form.flate_encode()),
+        float(box.left),
+        float(box.bottom),
+        float(box.width),
+        float(box.height),
+    )
 
 
-def encrypt_pdf(dir_path):
-    encryption_key = get_input()
+def add_stitched_page(writer, xobjects, layout, columns=2, spacing=0):
+    sizes = [(width, height) for _, _, _, width, height in xobjects]
+    positions, page_width, page_height = get_stitch_positions(
+        layout, sizes, columns, spacing
+    )
+    page = writer.add_blank_page(page_width, page_height)
+    names = pypdf.generic.DictionaryObject()
+    commands = []
+    for index, ((reference, left, bottom, _, _), (x, y)) in enumerate(
+        zip(xobjects, positions)
+    ):
+        name = f"/P{index}"
+        names[pypdf.generic.NameObject(name)] = reference
+        commands.append(f"q 1 0 0 1 {x - left:g} {y - bottom:g} cm {name} Do Q")
+    page[pypdf.generic.NameObject("/Resources")] = pypdf.generic.DictionaryObject(
+        {pypdf.generic.NameObject("/XObject"): names}
+    )
+    content = pypdf.generic.DecodedStreamObject()
+    content.set_data("\n".join(commands).encode())
+    page[pypdf.generic.NameObject("/Contents")] = writer._add_object(
+        content.flate_encode()
+    )
+    return page
+
+
+def get_stitch_positions(layout, sizes, columns=2, spacing=0):
+    widths = [width for width, _ in sizes]
+    heights = [height for _, height in sizes]
+    gaps = spacing * (len(sizes) - 1)
+    positions = []
+    if layout == "vertical":
+        page_width, page_height = max(widths), sum(heights) + gaps
+        top = page_height
+        for height in heights:
+            top -= height
+            positions.append((0, top))
+            top -= spacing
+    elif layout == "horizontal":
+        page_width, page_height = sum(widths) + gaps, max(heights)
+        left = 0
+        for width in widths:
+            positions.append((left, 0))
+            left += width + spacing
+    elif layout == "grid":
+        columns = max(1, min(columns, len(sizes)))
+        rows = -(-len(sizes) // columns)
+        cell_width, cell_height = max(widths), max(heights)
+        page_width = columns * cell_width + spacing * (columns - 1)
+        page_height = rows * cell_height + spacing * (rows - 1)
+        for index in range(len(sizes)):
+            row, column = divmod(index, columns)
+            positions.append(
+                (
+                    column * (cell_width + spacing),
+                    page_height - (row + 1) * cell_height - row * spacing,
+                )
+            )
+    else:
+        raise ValueError(f"Unknown stitch layout: {layout}")
+    return positions, page_width, page_height
+
+
+def get_layout_options():
+    options = {"layouts": [], "columns": 2, "spacing": 0}
+    for token in str(input_text).lower().split():
+        if token in STITCH_LAYOUTS:
+            options["layouts"].append(token)
+        elif token.startswith("grid") and token[4:].isdigit():
+            options["layouts"].append("grid")
+            options["columns"] = int(token[4:])
+        elif token.startswith("gap") and token[3:].isdigit():
+            options["spacing"] = int(token[3:])
+    options["layouts"] = options["layouts"] or ["vertical", "horizontal"]
+    return options
+
+
+@instrumentation.operation
+def encrypt_pdf(dir_path, encryption_key=None):
+    encryption_key = encryption_key or get_input()
     if not encryption_key:
         if status_field:
             status_field.setText("No encryption key provided.")
         return
-    for pdf_path in index_directory(dir_path, "pdf"):
-        with open(pdf_path, "rb") as pdf_file:
-            reader = pypdf.PdfReader(pdf_file)
-            writer = pypdf.PdfWriter()
-            writer.append_pages_from_reader(reader)
-            writer.encrypt(user_password=encryption_key)
-            output_path = os.path.join(
-                get_folder_path(pdf_path),
-                f"_encrypted_{strip_ext(get_file_name(pdf_path))}.pdf",
-            )
-            with open(output_path, "wb") as encrypted_pdf:
-                writer.write(encrypted_pdf)
-            if status_field:
-                status_field.setText(f"Encrypted PDF created: {output_path}")
+    # The manifest would have to record the key to notice a new one, so every
+    # PDF is encrypted again and no job file is written
+    file_paths = (
+        file_path
+        for file_path in iter_directory(dir_path, "pdf")
+        if not get_file_name(file_path).startswith("_encrypted_")
+    )
+    report_results(process_files(encrypt_pdf_file, file_paths, encryption_key))
+
+
+def encrypt_pdf_file(pdf_path, encryption_key):
+    with open(pdf_path, "rb") as pdf_file:
+        reader = pypdf.PdfReader(pdf_file)
+        writer = pypdf.PdfWriter()
+        writer.append_pages_from_reader(reader)
+        writer.encrypt(user_password=encryption_key)
+        output_path = os.path.join(
+            get_folder_path(pdf_path),
+            f"_encrypted_{strip_ext(get_file_name(pdf_path))}.pdf",
+        )
+        with instrumentation.phase("write"), atomic_output(output_path) as temp_path:
+            writer.write(temp_path)
+    return [output_path]
 
 
-def save_page_range(path, start_page, end_page):
-    range_input = get_input()
+@instrumentation.operation
+def save_page_range(path, start_page=0, end_page=0, ranges=None):
+    range_input = ranges or get_input()
     if not range_input:
         return
-    range_input = range_input.split("-")
-    if len(range_input) > 1:
-        if (
-            range_input[0]
-            and int(range_input[0]) > 0
-            and range_input[1]
-            and int(range_input[1]) > 0
-        ):
-            start_page = int(range_input[0])
-            end_page = int(range_input[1])
-        elif range_input[0] == "":
-            start_page = 1
-            end_page = int(range_input[1])
-        elif range_input[1] == "":
-            start_page = int(range_input[0])
-            end_page = -1
-    else:
-        start_page = end_page = int(range_input[0])
-    for file_path in index_directory(path, "pdf"):
-        reader = pypdf.PdfReader(file_path)
-        total_pages = len(reader.pages)
+    try:
+        range_spec = parse_page_ranges(range_input)
+    except ValueError as error:
+        if status_field:
+            status_field.setText(f"Invalid page range: {error}")
+        return
+    file_paths = iter_directory(path, "pdf")
+    if range_spec[0][0] == "search":
+        matches = search_pdf_text(path, range_spec[0][1])
+        if matches is None:
+            if status_field:
+                status_field.setText("No search index found. Run Index PDF Text first.")
+            return
+        file_paths = [file_path for file_path in file_paths if file_path in matches]
+    results, skipped = process_changed_files(
+        "save_page_range",
+        path,
+        "_range_",
+        save_page_range_file,
+        file_paths,
+        path,
+        range_spec,
+    )
+    report_results(results, skipped=skipped)
 
-        current_start = start_page
-        current_end = end_page
 
-        if current_start > total_pages:
+def save_page_range_file(file_path, path, range_spec):
+    output_paths = []
+    with open(file_path, "rb") as pdf_in:
+        reader = pypdf.PdfReader(pdf_in)
+        total_pages = len(reader.pages)
+        padding = get_padding(total_pages)
+        if range_spec[0][0] == "search":
+            page_ranges = group_pages(
+                (search_pdf_text(path, range_spec[0][1], file_path) or {}).get(
+                    file_path, []
+                )
+            )
+        else:
+            page_ranges = resolve_page_ranges(range_spec, reader)
+        for start_page, end_page in page_ranges:
+            writer = pypdf.PdfWriter()
+            for page in range(start_page - 1, end_page):
+                writer.add_page(reader.pages[page])
+            padded_start = str(start_page).zfill(padding)
+            padded_end = str(end_page).zfill(padding)
+            output_path = os.path.join(
+                path, f"_range_{padded_start}-{padded_end}_{get_file_name(file_path)}"
+            )
+            with (
+                instrumentation.phase("write"),
+                atomic_output(output_path) as temp_path,
+            ):
+                writer.write(temp_path)
+            output_paths.append(output_path)
+    return output_paths
+
+
+def parse_page_ranges(range_input):
+    if str(range_input).lower().startswith("search:"):
+        query = str(range_input)[7:].strip()
+        if not query:
+            raise ValueError(range_input)
+        return (("search", query),)
+    range_spec = []
+    for part in str(range_input).lower().split(","):
+        part = part.strip()
+        if not part:
             continue
-        if current_end == -1 or current_end > total_pages:
-            current_end = total_pages
+        if part in ("bookmarks", "bookmark"):
+            range_spec.append(("bookmarks",))
+        elif part.startswith("every"):
+            step = int(part[5:].strip())
+            if step < 1:
+                raise ValueError(part)
+            range_spec.append(("every", step))
+        elif "-" in part:
+            start, end = (value.strip() for value in part.split("-", 1))
+            start = int(start) if start else 1
+            end = int(end) if end else -1
+            if start < 1 or end == 0 or end < -1:
+                raise ValueError(part)
+            range_spec.append(("range", start, end))
+        else:
+            page = int(part)
+            if page < 1:
+                raise ValueError(part)
+            range_spec.append(("range", page, page))
+    if not range_spec:
+        raise ValueError(range_input)
+    return tuple(range_spec)
+
+
+def resolve_page_ranges(range_spec, reader):
+    total_pages = len(reader.pages)
+    page_ranges = []
+    for item in range_spec:
+        if item[0] == "range":
+            start_page, end_page = item[1], item[2]
+            if end_page == -1 or end_page > total_pages:
+                end_page = total_pages
+            page_ranges.append((start_page, end_page))
+        elif item[0] == "every":
+            page_ranges.extend(
+                (start_page, min(start_page + item[1] - 1, total_pages))
+                for start_page in range(1, total_pages + 1, item[1])
+            )
+        else:
+            starts = sorted(
+                {
+                    reader.get_destination_page_number(outline) + 1
+                    for outline in reader.outline
+                    if not isinstance(outline, list)
+                }
+                | {1}
+            )
+            page_ranges.extend(
+                (start_page, next_start - 1)
+                for start_page, next_start in zip(
+                    starts, starts[1:] + [total_pages + 1]
+                )
+            )
+    return list(
+        dict.fromkeys(
+            (start_page, end_page)
+            for start_page, end_page in page_ranges
+            if start_page <= total_pages and start_page <= end_page
+        )
+    )
 
-        padding = get_padding(total_pages)
-        padded_start = str(current_start).zfill(padding)
-        padded_end = str(current_end).zfill(padding)
 
-        writer = pypdf.PdfWriter()
-        for page in range(current_start - 1, current_end):
-            writer.add_page(reader.pages[page])
-        with open(
-            os.path.join(
-                path,
-                f"_range_{padded_start}-{padded_end}_{get_file_name(file_path)}",
-            ),
-            "wb",
-        ) as output_pdf:
-            writer.write(output_pdf)
+@instrumentation.operation
+def resave_files(path, sanitize=False, image_quality=None, max_dpi=None):
+    options = get_resave_options()
+    image_quality = image_quality or options["image_quality"]
+    max_dpi = max_dpi or options["max_dpi"]
+    file_paths = iter_directory(path, ["jpeg", "jpg", "pdf", "png"])
+    if sanitize:
+        results, skipped = process_files(resave_file, file_paths, True), 0
+    else:
+        results, skipped = process_changed_files(
+            "resave_files",
+            path,
+            None,
+            resave_file,
+            file_paths,
+            False,
+            image_quality,
+            max_dpi,
+        )
+    report_results(results, skipped=skipped)
 
 
-def resave_files(path, sanitize=False):
-    results = ""
-    for file_path in index_directory(path, ["jpeg", "jpg", "pdf", "png"]):
-        org_size = os.path.getsize(file_path) / 1024
-        if file_path.lower().endswith("pdf"):
+def resave_file(file_path, sanitize=False, image_quality=None, max_dpi=None):
+    org_size = os.path.getsize(file_path) / 1024
+    file_type = get_file_type(file_path)
+    output_path = file_path
+    if sanitize:
+        generic_name = (
+            "document.pdf" if file_type.lower() == "pdf" else f"image.{file_type}"
+        )
+        output_path = os.path.join(get_folder_path(file_path), generic_name)
+    with atomic_output(output_path) as temp_path:
+        if file_type.lower() == "pdf":
             with open(file_path, "rb") as pdf:
-                org = io.BytesIO(pdf.read())
-            reader = pypdf.PdfReader(org)
-            writer = pypdf.PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
-            os.remove(file_path)
-            if sanitize:
-                file_path = os.path.join(get_folder_path(file_path), "document.pdf")
-            writer._info = pypdf.generic.DictionaryObject()
-            with open(file_path, "wb") as pdf:
-                writer.write(pdf)
+                reader = pypdf.PdfReader(pdf)
+                writer = pypdf.PdfWriter()
+                for page in reader.pages:
+                    writer.add_page(page)
+                with instrumentation.phase("transform"):
+                    for page in writer.pages:
+                        page.compress_content_streams()
+                        if image_quality or max_dpi:
+                            recompress_page_images(page, image_quality, max_dpi)
+                    writer.compress_identical_objects(
+                        remove_identicals=True, remove_orphans=True
+                    )
+                writer._info = pypdf.generic.DictionaryObject()
+                with instrumentation.phase("write"):
+                    writer.write(temp_path)
         else:
-            with PIL.Image.open(file_path) as img:
+            with instrumentation.phase("decode"), PIL.Image.open(file_path) as img:
                 img_without_metadata = img.copy()
-            os.remove(file_path)
-            if sanitize:
-                file_path = os.path.join(
-                    get_folder_path(file_path), f"image.{get_file_type(file_path)}"
-                )
-            img_without_metadata.save(file_path)
-        new_size = os.path.getsize(file_path) / 1024
-        pct_chg = f"{round(((new_size - org_size) / org_size) * 100, 1)}%"
-        results += f"{file_path} {round(org_size, 1)} KB to {round(new_size, 1)} KB ({pct_chg})\n"
-    if status_field:
-        status_field.setText(results)
+            with instrumentation.phase("encode"):
+                if file_type.lower() == "png":
+                    img_without_metadata.save(temp_path, optimize=True)
+                elif image_quality:
+                    img_without_metadata.save(temp_path, quality=image_quality)
+                else:
+                    img_without_metadata.save(temp_path)
+        if not sanitize and os.path.getsize(temp_path) > os.path.getsize(file_path):
+            shutil.copyfile(file_path, temp_path)
+    if output_path != file_path:
+        os.remove(file_path)
+    new_size = os.path.getsize(output_path) / 1024
+    pct_chg = f"{round(((new_size - org_size) / org_size) * 100, 1)}%"
+    return (
+        f"{output_path} {round(org_size, 1)} KB to {round(new_size, 1)} KB ({pct_chg})"
+    )
+
+
+def recompress_page_images(page, image_quality=None, max_dpi=None):
+    page_width_inches = float(page.mediabox.width) / 72
+    for image_file in page.images:
+        image = image_file.image
+        if image.mode not in ("RGB", "L"):
+            continue
+        dpi = image.width / page_width_inches if page_width_inches else 0
+        downsample = max_dpi and dpi > max_dpi
+        if not (downsample or image_quality):
+            continue
+        if downsample:
+            scale = max_dpi / dpi
+            image = image.resize(
+                (
+                    max(1, round(image.width * scale)),
+                    max(1, round(image.height * scale)),
+                ),
+                PIL.Image.LANCZOS,
+            )
+        image_file.replace(image, quality=image_quality or 85)
+
 
+def get_resave_options():
+    options = {"image_quality": None, "max_dpi": None}
+    for token in str(input_text).lower().split():
+        if token.startswith("q") and token[1:].isdigit():
+            options["image_quality"] = min(95, int(token[1:]))
+        elif token.startswith("dpi") and token[3:].isdigit():
+            options["max_dpi"] = int(token[3:])
+    return options
 
-def pdf_to_image(path):
+
+@instrumentation.operation
+def pdf_to_image(path, dpi=None, fmt=None, grayscale=None, thread_count=None):
     if not shutil.which("pdftoppm"):
         if status_field:
             status_field.setText("Poppler (pdftoppm) not found in PATH.")
         return
+    options = get_render_options()
+    dpi = dpi or options["dpi"]
+    fmt = fmt or options["fmt"]
+    grayscale = options["grayscale"] if grayscale is None else grayscale
     file_paths = index_directory(path, "pdf")
-    for file in file_paths:
-        pdf_pages = pdf2image.convert_from_path(file)
-        padding = get_padding(len(pdf_pages))
-        for page_num, pdf_page in enumerate(pdf_pages, start=1):
-            padded_num = str(page_num).zfill(padding)
-            pdf_page.save(
-                os.path.join(
-                    path, f"_img_{strip_ext(get_file_name(file))} {padded_num}.png"
+    if thread_count is None:
+        parallel_files = max(1, min(max_workers, len(file_paths)))
+        thread_count = max(1, (os.cpu_count() or 1) // parallel_files)
+    results, skipped = process_changed_files(
+        "pdf_to_image",
+        path,
+        "_img_",
+        pdf_to_image_file,
+        file_paths,
+        path,
+        dpi,
+        fmt,
+        grayscale,
+        thread_count,
+        options=(path, dpi, fmt, grayscale),
+    )
+    report_results(results, skipped=skipped)
+
+
+def pdf_to_image_file(file, path, dpi=200, fmt="png", grayscale=False, thread_count=1):
+    page_count = pdf2image.pdfinfo_from_path(file)["Pages"]
+    padding = get_padding(page_count)
+    use_memory = use_memory_cache()
+    digest = get_file_hash(file) if use_memory or page_cache_disk_mb else None
+    output_paths = []
+    with tempfile.TemporaryDirectory(
+        prefix=f"{CONTROL_PREFIX}img_tmp_", dir=get_page_render_dir(path)
+    ) as temp_dir:
+        for pages in get_page_chunks(page_count):
+            keys = {page: (digest, page, dpi, grayscale) for page in pages}
+            images = {}
+            if use_memory:
+                images = {page: get_memory_page(keys[page]) for page in pages}
+            missing = [page for page in pages if images.get(page) is None]
+            page_files = {}
+            if missing and use_memory and not page_cache_disk_mb:
+                with instrumentation.phase("decode"):
+                    rendered = pdf2image.convert_from_path(
+                        file,
+                        dpi=dpi,
+                        grayscale=grayscale,
+                        first_page=missing[0],
+                        last_page=missing[-1],
+                        thread_count=thread_count,
+                    )
+                rendered_pages = range(missing[0], missing[-1] + 1)
+                for page, image in zip(rendered_pages, rendered):
+                    if images.get(page) is None:
+                        images[page] = image
+                        put_memory_page(keys[page], image)
+            elif missing:
+                page_files = get_page_files(
+                    file, digest, missing, dpi, grayscale, temp_dir, thread_count, fmt
+                )
+            for page_num in pages:
+                page_path = page_files.get(page_num)
+                extension = (
+                    os.path.splitext(page_path)[1]
+                    if page_path
+                    else PAGE_EXTENSIONS.get(fmt, f".{fmt}")
+                )
+                output_path = os.path.join(
+                    path,
+                    f"_img_{strip_ext(get_file_name(file))} "
+                    f"{str(page_num).zfill(padding)}{extension}",
                 )
+                if page_path and page_path.startswith(temp_dir):
+                    os.replace(page_path, output_path)
+                else:
+                    with (
+                        instrumentation.phase("write"),
+                        atomic_output(output_path) as temp_path,
+                    ):
+                        if page_path:
+                            shutil.copyfile(page_path, temp_path)
+                        else:
+                            images[page_num].save(temp_path, format=fmt)
+                output_paths.append(output_path)
+    trim_page_cache()
+    return output_paths
+
+
+def get_render_options():
+    options = {"dpi": 200, "fmt": "png", "grayscale": False}
+    for token in str(input_text).lower().split():
+        if token.isdigit():
+            options["dpi"] = int(token)
+        elif token in ("png", "jpeg", "jpg", "tiff"):
+            options["fmt"] = "jpeg" if token == "jpg" else token
+        elif token in ("gray", "grey", "grayscale"):
+            options["grayscale"] = True
+    return options
+
+
+@instrumentation.operation
+def image_to_pdf(path, single_document=None, page_size=None, fit=None):
+    if img2pdf is None:
+        if status_field:
+            status_field.setText("img2pdf is not installed.")
+        return
+    options = get_image_pdf_options()
+    single_document = options["single"] if single_document is None else single_document
+    page_size = page_size or options["page_size"]
+    fit = fit or options["fit"]
+    file_paths = iter_directory(path, file_types=["png", "jpg", "jpeg"])
+    if single_document:
+        manifest = RunManifest(path, "image_to_pdf_single", (page_size, fit))
+        image_paths = list(manifest.select(file_paths, "_pdf_", False))
+        if not image_paths:
+            if status_field:
+                status_field.setText("No images found to convert.")
+            return
+        if (
+            incremental
+            and not any(manifest.select(image_paths))
+            and not manifest.is_stale()
+        ):
+            if status_field:
+                status_field.setText("No changed images to convert.")
+            return
+        manifest.start_job()
+        output_path = os.path.join(
+            path, f"_pdf_all_{strip_ext(get_file_name(image_paths[0]))}.pdf"
+        )
+        with (
+            atomic_output(output_path) as temp_path,
+            open(temp_path, "wb") as output_pdf,
+        ):
+            write_pdf_in_chunks(
+                output_pdf,
+                image_paths,
+                IMAGE_PDF_CHUNK_FILES,
+                get_image_layout(page_size, fit),
+            )
+        manifest.reset()
+        for image_path in image_paths:
+            manifest.record(image_path, [output_path])
+        manifest.save()
+        results, skipped = [(path, [output_path], None)], 0
+    else:
+        results, skipped = process_changed_files(
+            "image_to_pdf",
+            path,
+            "_pdf_",
+            image_to_pdf_file,
+            file_paths,
+            path,
+            page_size,
+            fit,
+        )
+    report_results(results, skipped=skipped)
+
+
+def image_to_pdf_file(file_path, path, page_size=None, fit=None):
+    output_path = os.path.join(path, f"_pdf_{strip_ext(get_file_name(file_path))}.pdf")
+    with instrumentation.phase("write"), atomic_output(output_path) as temp_path:
+        with open(temp_path, "wb") as output_pdf:
+            img2pdf.convert(
+                file_path,
+                layout_fun=get_image_layout(page_size, fit),
+                outputstream=output_pdf,
             )
+    return [output_path]
 
 
-def image_to_pdf(path):
-    for file_path in index_directory(path, file_types=["png", "jpg"]):
-        img = PIL.Image.open(file_path)
-        img.save(
-            os.path.join(path, f"_pdf_{strip_ext(get_file_name(file_path))}.pdf"),
-            "PDF",
-            resolution=img.width / 850 * 100,
-        )
+def get_image_layout(page_size=None, fit=None):
+    if page_size is None:
+        return img2pdf.get_layout_fun((img2pdf.in_to_pt(8.5), None))
+    return img2pdf.get_layout_fun(
+        tuple(img2pdf.mm_to_pt(value) for value in PAGE_SIZES_MM[page_size]),
+        fit=img2pdf.FitMode[fit or "into"],
+    )
 
 
+def get_image_pdf_options():
+    options = {"single": False, "page_size": None, "fit": None}
+    for token in str(input_text).lower().split():
+        if token in ("single", "one"):
+            options["single"] = True
+        elif token in PAGE_SIZES_MM:
+            options["page_size"] = token
+        elif token in ("into", "fill", "exact", "shrink", "enlarge"):
+            options["fit"] = token
+    return options
+
+
+@instrumentation.operation
 def sanitize(path):
     resave_files(path, True)
 
 
+@instrumentation.operation
 def crop_images(path):
-    file_paths = index_directory(path, file_types=["png", "jpg"])
-    crop_configs = {
-        (1280, 1080): [(0, 0, 1280, 720)],
-        (2560, 720): [(0, 0, 1280, 720), (1280, 0, 2560, 720)],
-        (3200, 1080): [(0, 0, 1920, 1080), (1920, 0, 3200, 1080)],
-    }
-    for file_path in file_paths:
-        original_image = PIL.Image.open(file_path)
-        crop_areas = crop_configs.get(original_image.size)
+    file_paths = iter_directory(path, file_types=["png", "jpg"])
+    results, skipped = process_changed_files(
+        "crop_images", path, "_crop_", crop_images_file, file_paths, path
+    )
+    report_results(results, skipped=skipped)
+
+
+def crop_images_file(file_path, path):
+    output_paths = []
+    with PIL.Image.open(file_path) as original_image:
+        crop_areas = CROP_CONFIGS.get(original_image.size)
         if crop_areas is None:
-            continue
+            return output_paths
+        with instrumentation.phase("decode"):
+            original_image.load()
         padding = get_padding(len(crop_areas))
         for index, crop_area in enumerate(crop_areas, 1):
-            cropped_image = original_image.crop(box=crop_area)
+            with instrumentation.phase("transform"):
+                cropped_image = original_image.crop(box=crop_area)
             padded_index = str(index).zfill(padding)
-            cropped_image.save(
-                os.path.join(
-                    path,
-                    f"_crop_{strip_ext(get_file_name(file_path))}_{padded_index}.{get_file_type(file_path)}",
-                )
+            output_path = os.path.join(
+                path,
+                f"_crop_{strip_ext(get_file_name(file_path))}_{padded_index}.{get_file_type(file_path)}",
             )
-
-
-def merge_images(path):
-    file_paths = index_directory(path, file_types=["jpeg", "jpg", "png"])
-    if len(file_paths) == 1:
+            with (
+                instrumentation.phase("encode"),
+                atomic_output(output_path) as temp_path,
+            ):
+                cropped_image.save(temp_path)
+            output_paths.append(output_path)
+    return output_paths
+
+
+@instrumentation.operation
+def merge_images(
+    path, layouts=None, columns=None, spacing=None, formats=("png", "jpg")
+):
+    options = get_layout_options()
+    layouts = layouts or options["layouts"]
+    columns = columns or options["columns"]
+    spacing = options["spacing"] if spacing is None else spacing
+    file_paths = [
+        file_path
+        for file_path in iter_directory(path, file_types=["jpeg", "jpg", "png"])
+        if not get_file_name(file_path).startswith(("_v_merge", "_h_merge", "_g_merge"))
+    ]
+    if len(file_paths) < 2:
         if status_field:
             status_field.setText(
                 "Failed to merge images: need more than one image to merge"
             )
         return
-    imgs = []
-    max_width = max_height = 0
+    sizes = []
     for file_path in file_paths:
-        img = PIL.Image.open(file_path)
-        imgs.append(img)
-        width, height = img.size
-        max_width = max(max_width, width)
-        max_height = max(max_height, height)
-
-    v_scaled_imgs = [
-        numpy.array(
-            img.convert("RGB").resize(
-                (max_width, round(max_width / img.width * img.height))
-            )
-        )
-        for img in imgs
-    ]
-    h_scaled_imgs = [
-        numpy.array(
-            img.convert("RGB").resize(
-                (round(max_height / img.height * img.width), max_height)
+        with PIL.Image.open(file_path) as img:
+            sizes.append(img.size)
+
+    output_paths = []
+    for layout in layouts:
+        boxes, canvas_size = get_merge_layout(layout, sizes, columns, spacing)
+        canvas = PIL.Image.new("RGB", canvas_size, "white")
+        for file_path, (left, top, width, height) in zip(file_paths, boxes):
+            with PIL.Image.open(file_path) as img:
+                img.draft("RGB", (width, height))
+                canvas.paste(img.convert("RGB").resize((width, height)), (left, top))
+        for output_format in formats:
+            output_path = os.path.join(path, f"_{layout[0]}_merge.{output_format}")
+            with atomic_output(output_path) as temp_path:
+                canvas.save(temp_path)
+            output_paths.append(output_path)
+        del canvas
+    report_results([(path, output_paths, None)])
+
+
+def get_merge_layout(layout, sizes, columns=2, spacing=0):
+    max_width = max(width for width, _ in sizes)
+    max_height = max(height for _, height in sizes)
+    boxes = []
+    if layout == "vertical":
+        top = 0
+        for width, height in sizes:
+            scaled_height = round(max_width / width * height)
+            boxes.append((0, top, max_width, scaled_height))
+            top += scaled_height + spacing
+        return boxes, (max_width, top - spacing)
+    if layout == "horizontal":
+        left = 0
+        for width, height in sizes:
+            scaled_width = round(max_height / height * width)
+            boxes.append((left, 0, scaled_width, max_height))
+            left += scaled_width + spacing
+        return boxes, (left - spacing, max_height)
+    if layout == "grid":
+        columns = max(1, min(columns, len(sizes)))
+        rows = -(-len(sizes) // columns)
+        for index, (width, height) in enumerate(sizes):
+            row, column = divmod(index, columns)
+            scale = min(max_width / width, max_height / height)
+            scaled_width, scaled_height = round(width * scale), round(height * scale)
+            boxes.append(
+                (
+                    column * (max_width + spacing) + (max_width - scaled_width) // 2,
+                    row * (max_height + spacing) + (max_height - scaled_height) // 2,
+                    scaled_width,
+                    scaled_height,
+                )
             )
+        return boxes, (
+            columns * max_width + spacing * (columns - 1),
+            rows * max_height + spacing * (rows - 1),
         )
-        for img in imgs
-    ]
+    raise ValueError(f"Unknown merge layout: {layout}")
 
-    v_imgs_comb = numpy.vstack(v_scaled_imgs)
-    PIL.Image.fromarray(v_imgs_comb).save(os.path.join(path, "_v_merge.png"))
-    PIL.Image.fromarray(v_imgs_comb).convert("RGB").save(
-        os.path.join(path, "_v_merge.jpg")
-    )
 
-    h_imgs_comb = numpy.hstack(h_scaled_imgs)
-    PIL.Image.fromarray(h_imgs_comb).save(os.path.join(path, "_h_merge.png"))
-    PIL.Image.fromarray(h_imgs_comb).convert("RGB").save(
-        os.path.join(path, "_h_merge.jpg")
+@instrumentation.operation
+def convert_between_png_jpg(directory):
+    results, skipped = process_changed_files(
+        "convert_between_png_jpg",
+        directory,
+        "_conv_",
+        convert_between_png_jpg_file,
+        get_all_images(directory),
+        directory,
     )
+    report_results(results, skipped=skipped)
 
 
-def convert_between_png_jpg(directory):
-    for image_path in get_all_images(directory):
-        file_type = get_file_type(image_path)
+def convert_between_png_jpg_file(image_path, directory):
+    file_type = get_file_type(image_path)
+    with PIL.Image.open(image_path) as img:
+        with instrumentation.phase("decode"):
+            img.load()
         if file_type == "png":
-            PIL.Image.open(image_path).convert("RGB").save(
-                os.path.join(
-                    directory, f"_conv_{strip_ext(get_file_name(image_path))}.jpg"
-                )
+            output_path = os.path.join(
+                directory, f"_conv_{strip_ext(get_file_name(image_path))}.jpg"
             )
+            with instrumentation.phase("transform"):
+                img = img.convert("RGB")
         else:
-            PIL.Image.open(image_path).save(
-                os.path.join(
-                    directory, f"_conv_{strip_ext(get_file_name(image_path))}.png"
-                )
+            output_path = os.path.join(
+                directory, f"_conv_{strip_ext(get_file_name(image_path))}.png"
             )
+        with instrumentation.phase("encode"), atomic_output(output_path) as temp_path:
+            img.save(temp_path)
+    return [output_path]
 
 
+@instrumentation.operation
 def img_to_ico(path):
-    for file_path in get_all_images(path):
-        img = PIL.Image.open(file_path)
-        img.save(os.path.join(path, f"_ico_{strip_ext(get_file_name(file_path))}.ico"))
-
-
-def print_info(directory):
-    output = ""
-    files = index_directory(directory, file_types=["jpeg", "jpg", "pdf", "png"])
-    for index, path in enumerate(files):
-        size = os.path.getsize(path)
-        formatted_size = "{:,}".format(size)
-        if size < 1024 * 1024:
-            size_str = f"{formatted_size} bytes ({size / 1024:.2f} KB)"
-        else:
-            size_str = f"{formatted_size} bytes ({size / (1024 * 1024):.2f} MB)"
-        output += f"\n{index + 1}. {path}\n\tFile Size: {size_str}"
-        if path.endswith((".png", ".jpg", ".jpeg")):
-            img = PIL.Image.open(path)
-            output += f"\tWidth, Height, Mode = ({img.width}, {img.height}, {img.mode}) {img.format}\n"
-            for tag_id, value in img.getexif().items():
-                tag = str(PIL.ExifTags.TAGS.get(tag_id, tag_id))
-                output += f"\t{tag.ljust(25)}: {value}\n"
-        elif path.endswith(".pdf"):
-            with open(path, "rb") as f:
-                pdf = pypdf.PdfReader(f)
-                metadata = pdf.metadata or {}
-                output += "\n\tMetadata:\n"
-                for key, value in metadata.items():
-                    output += f"\t{key}: {value}\n"
+    results, skipped = process_changed_files(
+        "img_to_ico", path, "_ico_", img_to_ico_file, get_all_images(path), path
+    )
+    report_results(results, skipped=skipped)
+
+
+def img_to_ico_file(file_path, path):
+    output_path = os.path.join(path, f"_ico_{strip_ext(get_file_name(file_path))}.ico")
+    with PIL.Image.open(file_path) as img:
+        with instrumentation.phase("decode"):
+            img.load()
+        with instrumentation.phase("encode"), atomic_output(output_path) as temp_path:
+            img.save(temp_path)
+    return [output_path]
+
+
+@instrumentation.operation
+def print_info(directory, export=True):
+    results = process_files(
+        get_file_info,
+        iter_directory(directory, file_types=["jpeg", "jpg", "pdf", "png"]),
+    )
+    rows = [info for _, info, error in results if error is None]
+    failures = [(path, error) for path, _, error in results if error is not None]
+    if export and rows:
+        export_file_info(directory, rows)
+    total_size = sum(row["size"] for row in rows)
+    pdf_rows = [row for row in rows if row["type"] == "pdf"]
+    output = (
+        f"Scanned {len(results)} files ({format_size(total_size)})\n"
+        f"\tImages: {len(rows) - len(pdf_rows)}\n"
+        f"\tPDFs: {len(pdf_rows)} "
+        f"({sum(row['pages'] or 0 for row in pdf_rows)} pages)\n"
+    )
+    if export and rows:
+        output += f"\tDetails: {os.path.join(directory, '_info.jsonl')}\n"
+    for path, error in failures:
+        output += f"\nFailed: {path} ({error})"
+    if status_field:
+        status_field.setText(output)
+
+
+def get_file_info(path):
+    size = os.path.getsize(path)
+    info = {
+        "file": path,
+        "size": size,
+        "type": get_file_type(path).lower(),
+        "width": None,
+        "height": None,
+        "mode": None,
+        "format": None,
+        "pages": None,
+        "encrypted": None,
+        "metadata": {},
+    }
+    if info["type"] == "pdf":
+        with open(path, "rb") as f:
+            pdf = pypdf.PdfReader(f)
+            info["encrypted"] = pdf.is_encrypted
+            if not pdf.is_encrypted:
+                info["pages"] = len(pdf.pages)
+                info["metadata"] = {
+                    str(key): str(value) for key, value in (pdf.metadata or {}).items()
+                }
+    else:
+        with PIL.Image.open(path) as img:
+            info["width"], info["height"] = img.size
+            info["mode"], info["format"] = img.mode, img.format
+            info["metadata"] = {
+                str(PIL.ExifTags.TAGS.get(tag_id, tag_id)): str(value)
+                for tag_id, value in img.getexif().items()
+            }
+    return info
+
+
+def export_file_info(directory, rows):
+    with open(os.path.join(directory, "_info.jsonl"), "w") as jsonl_file:
+        for row in rows:
+            jsonl_file.write(json.dumps(row) + "\n")
+    with open(os.path.join(directory, "_info.csv"), "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, "metadata": json.dumps(row["metadata"])})
+
+
+@instrumentation.operation
+def index_pdf_text(dir_path):
+    with open_search_index(dir_path) as connection:
+        indexed = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in connection.execute(
+                "SELECT path, size, mtime_ns FROM files"
+            )
+        }
+        current = {}
+        for file_path in iter_directory(dir_path, "pdf"):
+            stat = os.stat(file_path)
+            current[file_path] = (stat.st_size, stat.st_mtime_ns)
+        removed = [
+            path for path in indexed if os.path.join(dir_path, path) not in current
+        ]
+        changed = [
+            file_path
+            for file_path, stat in current.items()
+            if indexed.get(os.path.relpath(file_path, dir_path)) != stat
+        ]
+        for path in removed:
+            delete_indexed_file(connection, path)
+        page_count = 0
+
+        def store(file_path, page_texts, error):
+            nonlocal page_count
+            path = os.path.relpath(file_path, dir_path)
+            delete_indexed_file(connection, path)
+            if error is not None:
+                return
+            connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?)", (path, *current[file_path])
+            )
+            connection.executemany(
+                "INSERT INTO pages (text, path, page) VALUES (?, ?, ?)",
+                (
+                    (text, path, page)
+                    for page, text in enumerate(page_texts, start=1)
+                    if text.strip()
+                ),
+            )
+            connection.commit()
+            page_count += len(page_texts)
+
+        results = process_files(extract_pdf_text, changed, on_result=store)
+    output = (
+        f"Indexed {len(results)} PDFs ({page_count} pages), "
+        f"{len(current) - len(changed)} unchanged, {len(removed)} removed."
+    )
+    for file_path, _, error in results:
+        if error is not None:
+            output += f"\nFailed: {file_path} ({error})"
+    if cancel_event.is_set():
+        output += "\nCancelled before all files were processed."
     if status_field:
-        status_field.setText(output.lstrip("\n"))
+        status_field.setText(output)
+
+
+def extract_pdf_text(file_path):
+    with open(file_path, "rb") as pdf_file, instrumentation.phase("decode"):
+        reader = pypdf.PdfReader(pdf_file)
+        return tuple(page.extract_text() or "" for page in reader.pages)
+
+
+@contextlib.contextmanager
+def open_search_index(dir_path):
+    connection = sqlite3.connect(os.path.join(dir_path, SEARCH_INDEX_NAME))
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS files"
+                " (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)"
+            )
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS pages"
+                " USING fts5(text, path UNINDEXED, page UNINDEXED)"
+            )
+            yield connection
+    finally:
+        connection.close()
+
+
+def delete_indexed_file(connection, path):
+    connection.execute("DELETE FROM files WHERE path = ?", (path,))
+    connection.execute("DELETE FROM pages WHERE path = ?", (path,))
+
+
+@instrumentation.operation
+def search_pdfs(dir_path, query=None):
+    query = query or get_input()
+    if not query:
+        return
+    matches = search_pdf_text(dir_path, query)
+    if matches is None:
+        output = "No search index found. Run Index PDF Text first."
+    elif not matches:
+        output = f"No pages match '{query}'."
+    else:
+        output = f"'{query}' found on {sum(map(len, matches.values()))} pages"
+        output += f" in {len(matches)} PDFs:"
+        for file_path, pages in matches.items():
+            output += f"\n{file_path}: {format_page_list(pages)}"
+    if status_field:
+        status_field.setText(output)
+
+
+def search_pdf_text(dir_path, query, file_path=None):
+    if not os.path.exists(os.path.join(dir_path, SEARCH_INDEX_NAME)):
+        return None
+    sql = "SELECT path, page FROM pages WHERE pages MATCH ?"
+    parameters = [query]
+    if file_path is not None:
+        sql += " AND path = ?"
+        parameters.append(os.path.relpath(file_path, dir_path))
+    with open_search_index(dir_path) as connection:
+        try:
+            rows = connection.execute(sql, parameters).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS5 query syntax, so search for the text as a phrase
+            parameters[0] = '"' + query.replace('"', '""') + '"'
+            rows = connection.execute(sql, parameters).fetchall()
+    matches = collections.defaultdict(list)
+    for path, page in sorted(rows):
+        matches[os.path.join(dir_path, path)].append(page)
+    return dict(matches)
+
+
+def group_pages(pages):
+    page_ranges = []
+    for page in sorted(set(pages)):
+        if page_ranges and page_ranges[-1][1] == page - 1:
+            page_ranges[-1] = (page_ranges[-1][0], page)
+        else:
+            page_ranges.append((page, page))
+    return page_ranges
+
+
+def format_page_list(pages):
+    return ", ".join(
+        str(start) if start == end else f"{start}-{end}"
+        for start, end in group_pages(pages)
+    )
 
 
+def format_size(size):
+    formatted_size = "{:,}".format(size)
+    if size < 1024 * 1024:
+        return f"{formatted_size} bytes ({size / 1024:.2f} KB)"
+    return f"{formatted_size} bytes ({size / (1024 * 1024):.2f} MB)"
+
+
+@instrumentation.operation
 def duplicate_detector(directory_path):
-    file_hashes = {}
+    file_stats = [
+        (entry.path, entry.stat())
+        for entry in indexer.scan_directory(
+            directory_path, exclude=f"{CONTROL_PREFIX}*"
+        )
+    ]
+    walk_order = {path: index for index, (path, _) in enumerate(file_stats)}
+
+    size_groups = collections.defaultdict(list)
+    for path, stat in file_stats:
+        size_groups[stat.st_size].append((path, stat))
+    candidates = [group for group in size_groups.values() if len(group) > 1]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HASH_THREADS) as executor:
+        partial_groups = []
+        for group in candidates:
+            if group[0][1].st_size <= 2 * PARTIAL_HASH_BYTES:
+                partial_groups.append(group)
+                continue
+            paths = [path for path, _ in group]
+            digests = executor.map(hash_file_edges, paths)
+            partial_groups.extend(group_by_digest(group, digests))
+
+        full_hashes = get_full_hashes(
+            [entry for group in partial_groups for entry in group], executor
+        )
+
     duplicates = []
-    for root, _, files in os.walk(directory_path):
-        for filename in files:
-            full_file_path = os.path.join(root, filename)
-            with open(full_file_path, "rb") as file:
-                file_content_hash = hashlib.md5(file.read()).hexdigest()
-            if file_content_hash in file_hashes:
-                duplicates.append((file_hashes[file_content_hash], full_file_path))
-            else:
-                file_hashes[file_content_hash] = full_file_path
+    for group in partial_groups:
+        digests = [full_hashes[path] for path, _ in group]
+        for same_group in group_by_digest(group, digests):
+            original = same_group[0][0]
+            duplicates.extend((original, path) for path, _ in same_group[1:])
+    duplicates.sort(key=lambda pair: walk_order[pair[1]])
+
     result_msg = (
         "Duplicate files found:\n" if any(duplicates) else "No duplicate files found."
     )
@@ -406,139 +1291,724 @@ def duplicate_detector(directory_path):
         status_field.setText(result_msg)
 
 
-def get_image_colors(directory_path):
-    results = []
-
-    for full_file_path in index_directory(
-        directory_path, file_types=["jpeg", "jpg", "png"]
+@instrumentation.operation
+def near_duplicate_detector(directory_path, threshold=None, method="dhash"):
+    if threshold is None:
+        threshold = int(input_text) if str(input_text).isdigit() else 6
+    file_paths = index_directory(
+        directory_path, file_types=["jpeg", "jpg", "png", "webp", "bmp"]
+    )
+    tree = BKTree()
+    hashes = []
+    for file_path, image_hash, error in process_files(
+        perceptual_hash_file, file_paths, method
     ):
-        img = PIL.Image.open(full_file_path)
-        if img.mode == "RGBA":
-            colors = [pixel[:3] for pixel in img.getdata() if pixel[3] == 255]
-        else:
-            colors = [pixel[:3] for pixel in img.getdata()]
-        avg_color = numpy.mean(colors, axis=0)
-        avg_color_hex = "#%02x%02x%02x" % (
-            int(avg_color[0]),
-            int(avg_color[1]),
-            int(avg_color[2]),
+        if error is None:
+            hashes.append((file_path, image_hash))
+            tree.add(image_hash, len(hashes) - 1)
+
+    parents = list(range(len(hashes)))
+
+    def find_root(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for index, (_, image_hash) in enumerate(hashes):
+        for match in tree.find(image_hash, threshold):
+            parents[find_root(match)] = find_root(index)
+
+    clusters = collections.defaultdict(list)
+    for index, (file_path, _) in enumerate(hashes):
+        clusters[find_root(index)].append(file_path)
+    clusters = [paths for paths in clusters.values() if len(paths) > 1]
+
+    result_msg = (
+        f"Similar images found (distance <= {threshold}):\n"
+        if clusters
+        else "No similar images found."
+    )
+    for number, paths in enumerate(clusters, start=1):
+        result_msg += f"\nCluster {number}:\n" + "\n".join(paths) + "\n"
+    if status_field:
+        status_field.setText(result_msg)
+
+
+def perceptual_hash_file(file_path, method="dhash"):
+    with instrumentation.phase("decode"), PIL.Image.open(file_path) as img:
+        img.draft("L", (64, 64))
+        gray = img.convert("L")
+    if method == "ahash":
+        pixels = numpy.asarray(gray.resize((8, 8), PIL.Image.BOX), dtype=numpy.float32)
+        bits = pixels > pixels.mean()
+    elif method == "phash":
+        pixels = numpy.asarray(
+            gray.resize((32, 32), PIL.Image.BOX), dtype=numpy.float64
         )
-        color_counter = collections.Counter(colors)
-        common_colors = color_counter.most_common(3)
-        common_colors_hex = [
-            (("#%02x%02x%02x" % (color[0][0], color[0][1], color[0][2])), color[1])
-            for color in common_colors
-        ]
-        avg_color_str = f"Average color: {avg_color_hex}"
-        common_colors_str = "\n".join(
-            [f"Color: {color[0]}, Frequency: {color[1]}" for color in common_colors_hex]
+        dct = get_dct_matrix(32)
+        coefficients = (dct @ pixels @ dct.T)[:8, :8]
+        bits = coefficients > numpy.median(coefficients.flatten()[1:])
+    else:
+        pixels = numpy.asarray(gray.resize((9, 8), PIL.Image.BOX), dtype=numpy.int16)
+        bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(numpy.packbits(bits.flatten()).tobytes(), "big")
+
+
+def get_dct_matrix(size):
+    rows = numpy.arange(size)[:, None]
+    cols = numpy.arange(size)[None, :]
+    matrix = numpy.cos(numpy.pi * (2 * cols + 1) * rows / (2 * size))
+    matrix[0] *= numpy.sqrt(1 / size)
+    matrix[1:] *= numpy.sqrt(2 / size)
+    return matrix
+
+
+class BKTree:
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = (value, [item], {})
+                return
+            node = node[2][distance]
+
+    def find(self, value, max_distance):
+        matches = []
+        nodes = [self.root] if self.root else []
+        while nodes:
+            node_value, items, children = nodes.pop()
+            distance = (node_value ^ value).bit_count()
+            if distance <= max_distance:
+                matches.extend(items)
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+        return matches
+
+
+def group_by_digest(group, digests):
+    digest_groups = collections.defaultdict(list)
+    for entry, digest in zip(group, digests):
+        digest_groups[digest].append(entry)
+    return [entries for entries in digest_groups.values() if len(entries) > 1]
+
+
+def hash_file_edges(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        digest.update(file.read(PARTIAL_HASH_BYTES))
+        file.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+        digest.update(file.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.blake2b()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_file_hash(path):
+    return get_full_hashes([(path, os.stat(path))])[path]
+
+
+def get_full_hashes(entries, executor=None):
+    full_hashes = {}
+    if not entries:
+        return full_hashes
+    os.makedirs(get_folder_path(HASH_CACHE_PATH), exist_ok=True)
+    with sqlite3.connect(HASH_CACHE_PATH) as connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER,"
+            " mtime_ns INTEGER, inode INTEGER, digest TEXT)"
         )
-        results.append(
-            f"Filename: {full_file_path}\n" + avg_color_str + "\n" + common_colors_str
+        missing = []
+        for path, stat in entries:
+            row = connection.execute(
+                "SELECT digest FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?"
+                " AND inode = ?",
+                (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino),
+            ).fetchone()
+            if row:
+                full_hashes[path] = row[0]
+            else:
+                missing.append((path, stat))
+        digests = (executor.map if executor else map)(
+            hash_file, [path for path, _ in missing]
         )
-    if status_field:
-        status_field.setText("\n\n".join(results))
+        for (path, stat), digest in zip(missing, digests):
+            full_hashes[path] = digest
+            connection.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                (
+                    os.path.abspath(path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    stat.st_ino,
+                    digest,
+                ),
+            )
+    return full_hashes
+
+
+@instrumentation.operation
+def get_image_colors(directory_path, max_pixels=None, palette_size=0, export=True):
+    file_paths = iter_directory(directory_path, file_types=["jpeg", "jpg", "png"])
+    results = process_files(get_image_colors_file, file_paths, max_pixels, palette_size)
+    if export and results:
+        export_image_colors(directory_path, results)
+    report_results(
+        [
+            (file_path, format_image_colors(info) if info else info, error)
+            for file_path, info, error in results
+        ],
+        separator="\n\n",
+    )
 
 
-def crop_by_90(directory_path):
-    for full_file_path in index_directory(
-        directory_path, file_types=["jpeg", "jpg", "png"]
-    ):
-        img = PIL.Image.open(full_file_path)
+def get_image_colors_file(full_file_path, max_pixels=None, palette_size=0):
+    with PIL.Image.open(full_file_path) as img:
         width, height = img.size
-        new_width = round(width * 0.9)
-        new_height = round(height * 0.9)
-        left = (width - new_width) / 2
-        top = (height - new_height) / 2
-        right = (width + new_width) / 2
-        bottom = (height + new_height) / 2
-        img_cropped = img.crop((left, top, right, bottom))
-        img_cropped.save(
-            os.path.join(
-                directory_path,
-                f"_crop90_{strip_ext(get_file_name(full_file_path))}.{get_file_type(full_file_path)}",
+        if max_pixels and width * height > max_pixels:
+            scale = (max_pixels / (width * height)) ** 0.5
+            img.draft("RGB", (round(width * scale), round(height * scale)))
+            with instrumentation.phase("decode"):
+                img = img.resize(
+                    (max(1, round(width * scale)), max(1, round(height * scale))),
+                    PIL.Image.NEAREST,
+                )
+        has_alpha = img.mode == "RGBA"
+        with instrumentation.phase("decode"):
+            pixels = numpy.asarray(img.convert("RGBA" if has_alpha else "RGB"))
+    pixels = pixels.reshape(-1, pixels.shape[-1])
+    if has_alpha:
+        pixels = pixels[pixels[:, 3] == 255]
+    rgb = pixels[:, :3]
+    info = {
+        "file": full_file_path,
+        "width": width,
+        "height": height,
+        "pixels": len(rgb),
+        "average": None,
+        "common": [],
+        "palette": [],
+    }
+    if not len(rgb):
+        return info
+    info["average"] = to_hex_color(rgb.mean(axis=0).astype(int))
+
+    packed = (
+        (rgb[:, 0].astype(numpy.uint32) << 16)
+        | (rgb[:, 1].astype(numpy.uint32) << 8)
+        | rgb[:, 2]
+    )
+    if len(packed) > 1 << 22:
+        counts = numpy.bincount(packed, minlength=1 << 24)
+        colors = numpy.flatnonzero(counts)
+        counts = counts[colors]
+    else:
+        colors, counts = numpy.unique(packed, return_counts=True)
+    top = numpy.argsort(-counts, kind="stable")[:3]
+    info["common"] = [
+        [to_hex_color(unpack_color(colors[index])), int(counts[index])] for index in top
+    ]
+    if palette_size:
+        info["palette"] = get_color_palette(rgb, palette_size)
+    return info
+
+
+def get_color_palette(rgb, palette_size, iterations=10, sample_size=20000):
+    rng = numpy.random.default_rng(0)
+    if len(rgb) > sample_size:
+        rgb = rgb[rng.choice(len(rgb), sample_size, replace=False)]
+    samples = rgb.astype(numpy.float32)
+    palette_size = min(palette_size, len(samples))
+    centers = samples[rng.choice(len(samples), palette_size, replace=False)]
+    for _ in range(iterations):
+        distances = ((samples[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        for index in range(palette_size):
+            members = samples[labels == index]
+            if len(members):
+                centers[index] = members.mean(axis=0)
+    shares = numpy.bincount(labels, minlength=palette_size) / len(samples)
+    order = numpy.argsort(-shares, kind="stable")
+    return [
+        [to_hex_color(centers[index].astype(int)), round(float(shares[index]), 4)]
+        for index in order
+    ]
+
+
+def unpack_color(packed):
+    return (int(packed) >> 16) & 255, (int(packed) >> 8) & 255, int(packed) & 255
+
+
+def to_hex_color(color):
+    return "#%02x%02x%02x" % (int(color[0]), int(color[1]), int(color[2]))
+
+
+def format_image_colors(info):
+    lines = [f"Filename: {info['file']}", f"Average color: {info['average']}"]
+    lines += [f"Color: {color}, Frequency: {count}" for color, count in info["common"]]
+    lines += [
+        f"Palette: {color}, Share: {share:.1%}" for color, share in info["palette"]
+    ]
+    return "\n".join(lines)
+
+
+def export_image_colors(directory_path, results):
+    rows = [info for _, info, error in results if error is None]
+    with open(os.path.join(directory_path, "_colors.json"), "w") as json_file:
+        json.dump(rows, json_file, indent=2)
+    with open(os.path.join(directory_path, "_colors.csv"), "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(
+            ["file", "width", "height", "pixels", "average", "common", "palette"]
+        )
+        for info in rows:
+            writer.writerow(
+                [
+                    info["file"],
+                    info["width"],
+                    info["height"],
+                    info["pixels"],
+                    info["average"],
+                    " ".join(f"{color}:{count}" for color, count in info["common"]),
+                    " ".join(f"{color}:{share}" for color, share in info["palette"]),
+                ]
             )
+
+
+@instrumentation.operation
+def crop_by_90(directory_path):
+    file_paths = iter_directory(directory_path, file_types=["jpeg", "jpg", "png"])
+    results, skipped = process_changed_files(
+        "crop_by_90",
+        directory_path,
+        "_crop90_",
+        crop_by_90_file,
+        file_paths,
+        directory_path,
+    )
+    report_results(results, skipped=skipped)
+
+
+def crop_by_90_file(full_file_path, directory_path):
+    with PIL.Image.open(full_file_path) as img:
+        with instrumentation.phase("decode"):
+            img.load()
+        with instrumentation.phase("transform"):
+            img_cropped = crop_by_90_image(img)
+        output_path = os.path.join(
+            directory_path,
+            f"_crop90_{strip_ext(get_file_name(full_file_path))}.{get_file_type(full_file_path)}",
         )
+        with instrumentation.phase("encode"), atomic_output(output_path) as temp_path:
+            img_cropped.save(temp_path)
+    return [output_path]
+
+
+def crop_by_90_image(img):
+    width, height = img.size
+    new_width = round(width * 0.9)
+    new_height = round(height * 0.9)
+    left = (width - new_width) / 2
+    top = (height - new_height) / 2
+    right = (width + new_width) / 2
+    bottom = (height + new_height) / 2
+    return img.crop((left, top, right, bottom))
+
+
+@instrumentation.operation
+def convert_svg_and_webp_to_png(directory_path, scale=None, renderers=None, width=None):
+    options = get_svg_options()
+    scale = scale or options["scale"]
+    width = width or options["width"]
+    if renderers is None:
+        # Each renderer is a headless Chromium, so only the cairosvg fallback
+        # gets one process per CPU
+        renderers = min(max_workers, SVG_RENDERERS) if playwright else max_workers
+    file_paths = index_directory(directory_path, file_types=["svg", "webp"])
+    svg_paths = [path for path in file_paths if path.endswith(".svg")]
+    webp_paths = [path for path in file_paths if path.endswith(".webp")]
+    results = process_files(
+        render_svg_file,
+        svg_paths,
+        scale,
+        width,
+        workers=renderers,
+        initializer=start_svg_renderer,
+        initargs=(scale,),
+    )
+    stop_svg_renderer()
+    results += process_files(convert_webp_file, webp_paths, directory_path)
+    order = {path: index for index, path in enumerate(file_paths)}
+    results.sort(key=lambda result: order[result[0]])
+    report_results(results)
+
+
+def get_svg_options():
+    options = {"scale": 1, "width": None}
+    for token in str(input_text).lower().split():
+        if token.endswith("px") and token[:-2].isdigit():
+            options["width"] = int(token[:-2])
+        else:
+            try:
+                options["scale"] = float(token)
+            except ValueError:
+                pass
+    return options
 
 
-def convert_svg_and_webp_to_png(directory_path):
-    for full_file_path in index_directory(directory_path, file_types=["svg", "webp"]):
-        output_path = f"{strip_ext(full_file_path)}.png"
-        if full_file_path.endswith(".svg"):
-            success = False
-            if playwright is not None:
-                try:
-                    with playwright.sync_api.sync_playwright() as p:
-                        browser = p.chromium.launch(headless=True)
-                        page = browser.new_page()
-                        page.goto(f"file://{os.path.abspath(full_file_path)}")
-                        svg_element = page.locator("svg")
-                        svg_element.screenshot(path=output_path, omit_background=True)
-                        browser.close()
-                        success = True
-                except Exception:
-                    pass
-
-            if not success and cairosvg is not None:
-                try:
-                    with open(
-                        full_file_path, "r", encoding="utf-8", errors="ignore"
-                    ) as f:
-                        svg_data = f.read()
-
-                    style_tag = "<style>text { font-family: sans-serif; }</style>"
-                    if "<svg" in svg_data:
-                        tag_end = svg_data.find(">") + 1
-                        svg_data = svg_data[:tag_end] + style_tag + svg_data[tag_end:]
-
-                    emoji_pattern = re.compile(
-                        r"([\U0001f300-\U0001f64f\U0001f680-\U0001f6ff\U0001f1e0-\U0001f1ff\U00002700-\U000027bf\U0001f900-\U0001f9ff\U0001f3fb-\U0001f3ff])"
-                    )
-                    if emoji_pattern.search(svg_data):
-                        svg_data = emoji_pattern.sub(
-                            r"<tspan font-family='Apple Color Emoji'>\1</tspan>",
-                            svg_data,
-                        )
-
-                    cairosvg.svg2png(
-                        bytestring=svg_data.encode("utf-8"), write_to=output_path
-                    )
-                except Exception:
-                    cairosvg.svg2png(url=full_file_path, write_to=output_path)
-
-        elif full_file_path.endswith(".webp"):
-            img = PIL.Image.open(full_file_path)
-            img.save(
-                os.path.join(
-                    directory_path,
-                    f"_conv_{strip_ext(get_file_name(full_file_path))}.png",
-                ),
-                "PNG",
+def start_svg_renderer(scale=1):
+    global svg_renderer
+    if playwright is None or svg_renderer is not None:
+        return
+    try:
+        manager = playwright.sync_api.sync_playwright().start()
+        browser = manager.chromium.launch(headless=True)
+        page = browser.new_page(device_scale_factor=scale)
+    except Exception:
+        return
+    svg_renderer = (manager, browser, page)
+    multiprocessing.util.Finalize(None, stop_svg_renderer, exitpriority=10)
+
+
+def stop_svg_renderer():
+    global svg_renderer
+    if svg_renderer is None:
+        return
+    manager, browser, _ = svg_renderer
+    svg_renderer = None
+    try:
+        browser.close()
+        manager.stop()
+    except Exception:
+        pass
+
+
+def render_svg_file(full_file_path, scale=1, width=None):
+    output_path = f"{strip_ext(full_file_path)}.png"
+    cairo_scale = 1 if width else scale
+    if svg_renderer is not None:
+        try:
+            page = svg_renderer[2]
+            page.goto(f"file://{os.path.abspath(full_file_path)}")
+            svg = page.locator("svg").first
+            if width:
+                # The page renders at the scale factor, so divide it back out
+                svg.evaluate(
+                    "(svg, width) => { svg.style.width = width + 'px';"
+                    " svg.style.height = 'auto'; }",
+                    width / scale,
+                )
+            svg.screenshot(path=output_path, omit_background=True)
+            return [output_path]
+        except Exception:
+            pass
+
+    cairosvg = get_cairosvg()
+    if cairosvg is None:
+        raise RuntimeError("Neither playwright nor cairosvg is available.")
+    try:
+        with open(full_file_path, "r", encoding="utf-8", errors="ignore") as f:
+            svg_data = f.read()
+
+        style_tag = "<style>text { font-family: sans-serif; }</style>"
+        if "<svg" in svg_data:
+            tag_end = svg_data.find(">") + 1
+            svg_data = svg_data[:tag_end] + style_tag + svg_data[tag_end:]
+
+        emoji_pattern = re.compile(
+            r"([\U0001f300-\U0001f64f\U0001f680-\U0001f6ff\U0001f1e0-\U0001f1ff\U00002700-\U000027bf\U0001f900-\U0001f9ff\U0001f3fb-\U0001f3ff])"
+        )
+        if emoji_pattern.search(svg_data):
+            svg_data = emoji_pattern.sub(
+                r"<tspan font-family='Apple Color Emoji'>\1</tspan>",
+                svg_data,
             )
 
+        cairosvg.svg2png(
+            bytestring=svg_data.encode("utf-8"),
+            write_to=output_path,
+            scale=cairo_scale,
+            output_width=width,
+        )
+    except Exception:
+        cairosvg.svg2png(
+            url=full_file_path,
+            write_to=output_path,
+            scale=cairo_scale,
+            output_width=width,
+        )
+    return [output_path]
+
+
+def convert_webp_file(full_file_path, directory_path):
+    output_path = os.path.join(
+        directory_path, f"_conv_{strip_ext(get_file_name(full_file_path))}.png"
+    )
+    with PIL.Image.open(full_file_path) as img:
+        with instrumentation.phase("decode"):
+            img.load()
+        with instrumentation.phase("encode"), atomic_output(output_path) as temp_path:
+            img.save(temp_path, "PNG")
+    return [output_path]
+
 
-def enhance_contrast(dir_path):
+@instrumentation.operation
+def enhance_contrast(dir_path, factor=None, quality=90):
     if img2pdf is None:
         if status_field:
             status_field.setText("img2pdf is not installed.")
         return
-    pdf_paths = index_directory(dir_path, "pdf")
-    for path in pdf_paths:
-        enhanced_images = []
-        for image in pdf2image.convert_from_path(path):
-            enhanced_image = PIL.ImageEnhance.Contrast(image).enhance(1.25)
+    factor = factor or get_contrast_factor()
+    results, skipped = process_changed_files(
+        "enhance_contrast",
+        dir_path,
+        "_contrast_",
+        enhance_contrast_file,
+        iter_directory(dir_path, "pdf"),
+        dir_path,
+        factor,
+        quality,
+    )
+    report_results(results, skipped=skipped)
+
+
+def enhance_contrast_file(path, dir_path, factor=1.25, quality=90):
+    def encoded_pages():
+        for image in instrumentation.timed(render_pdf_pages(path), "decode"):
+            with instrumentation.phase("transform"):
+                image = apply_contrast(image, factor)
             byte_io = io.BytesIO()
-            enhanced_image.save(byte_io, format="PNG")
-            enhanced_images.append(byte_io.getvalue())
-        output_path = os.path.join(
-            dir_path, f"_contrast_{strip_ext(get_file_name(path))}.pdf"
-        )
-        with open(output_path, "wb") as file:
-            file.write(img2pdf.convert(enhanced_images))
+            with instrumentation.phase("encode"):
+                image.save(byte_io, format="JPEG", quality=quality)
+            yield byte_io.getvalue()
+
+    output_path = os.path.join(
+        dir_path, f"_contrast_{strip_ext(get_file_name(path))}.pdf"
+    )
+    with atomic_output(output_path) as temp_path, open(temp_path, "wb") as file:
+        write_pdf_in_chunks(file, encoded_pages(), RENDER_CHUNK_PAGES)
+    return [output_path]
+
+
+def write_pdf_in_chunks(output_file, images, chunk_size, layout_fun=None):
+    writer = StreamingPdfWriter(output_file)
+    images = iter(images)
+    while chunk := list(itertools.islice(images, chunk_size)):
+        with instrumentation.phase("write"):
+            writer.append(
+                img2pdf.convert(
+                    chunk, layout_fun=layout_fun or img2pdf.default_layout_fun
+                )
+            )
+    with instrumentation.phase("write"):
+        writer.close()
+
+
+def render_pdf_pages(path, dpi=200, grayscale=False, page_count=None):
+    if page_count is None:
+        page_count = pdf2image.pdfinfo_from_path(path)["Pages"]
+    use_memory = use_memory_cache()
+    if not use_memory and not page_cache_disk_mb:
+        for pages in get_page_chunks(page_count):
+            yield from pdf2image.convert_from_path(
+                path,
+                dpi=dpi,
+                grayscale=grayscale,
+                first_page=pages[0],
+                last_page=pages[-1],
+            )
+        return
+    digest = get_file_hash(path)
+    with tempfile.TemporaryDirectory(
+        prefix="_render_", dir=get_page_render_dir()
+    ) as temp_dir:
+        for pages in get_page_chunks(page_count):
+            keys = {page: (digest, page, dpi, grayscale) for page in pages}
+            images = {page: get_memory_page(key) for page, key in keys.items()}
+            missing = [page for page, image in images.items() if image is None]
+            if missing and not page_cache_disk_mb:
+                rendered = pdf2image.convert_from_path(
+                    path,
+                    dpi=dpi,
+                    grayscale=grayscale,
+                    first_page=missing[0],
+                    last_page=missing[-1],
+                )
+                for page, image in zip(range(missing[0], missing[-1] + 1), rendered):
+                    images[page] = images[page] or image
+            elif missing:
+                page_files = get_page_files(
+                    path, digest, missing, dpi, grayscale, temp_dir
+                )
+                for page, page_path in page_files.items():
+                    with PIL.Image.open(page_path) as image:
+                        image.load()
+                    images[page] = image
+            if use_memory:
+                for page in missing:
+                    put_memory_page(keys[page], images[page])
+            yield from images.values()
+    trim_page_cache()
+
+
+def get_page_chunks(page_count):
+    for first_page in range(1, page_count + 1, RENDER_CHUNK_PAGES):
+        last_page = min(first_page + RENDER_CHUNK_PAGES - 1, page_count)
+        yield list(range(first_page, last_page + 1))
+
+
+def get_page_files(
+    path, digest, pages, dpi, grayscale, temp_dir, thread_count=1, fmt="png"
+):
+    page_files = {}
+    for page in pages:
+        cached_path = get_disk_page((digest, page, dpi, grayscale), fmt)
+        if cached_path:
+            page_files[page] = cached_path
+    missing = [page for page in pages if page not in page_files]
+    if missing:
+        with instrumentation.phase("decode"):
+            rendered_paths = pdf2image.convert_from_path(
+                path,
+                dpi=dpi,
+                fmt=fmt,
+                grayscale=grayscale,
+                first_page=missing[0],
+                last_page=missing[-1],
+                output_folder=temp_dir,
+                paths_only=True,
+                thread_count=thread_count,
+            )
+        rendered_pages = range(missing[0], missing[-1] + 1)
+        for page, rendered_path in zip(rendered_pages, rendered_paths):
+            if page in page_files:
+                os.remove(rendered_path)
+            else:
+                page_files[page] = put_disk_page(
+                    (digest, page, dpi, grayscale), rendered_path
+                )
+    return dict(sorted(page_files.items()))
+
+
+def get_page_render_dir(fallback=None):
+    if not page_cache_disk_mb:
+        return fallback
+    os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+    return PAGE_CACHE_DIR
+
+
+def get_page_cache_path(key, extension=".png"):
+    digest, page, dpi, grayscale = key
+    mode = "gray" if grayscale else "rgb"
+    return os.path.join(PAGE_CACHE_DIR, f"{digest}_{dpi}_{mode}_{page}{extension}")
+
+
+def use_memory_cache():
+    # Pool workers exit after each operation, so only the main process keeps pages
+    return bool(page_cache_memory_mb) and multiprocessing.parent_process() is None
+
+
+def get_memory_page(key):
+    with page_cache_lock:
+        if key not in page_cache:
+            return None
+        page_cache.move_to_end(key)
+        return page_cache[key]
+
+
+def put_memory_page(key, image):
+    global page_cache_bytes
+    size = image.width * image.height * len(image.getbands())
+    limit = page_cache_memory_mb * 1024 * 1024
+    if size > limit:
+        return
+    with page_cache_lock:
+        if key in page_cache:
+            return
+        page_cache[key] = image
+        page_cache_bytes += size
+        while page_cache_bytes > limit:
+            _, evicted = page_cache.popitem(last=False)
+            page_cache_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+
+
+def get_disk_page(key, fmt="png"):
+    if not page_cache_disk_mb:
+        return None
+    cache_path = get_page_cache_path(key, PAGE_EXTENSIONS.get(fmt, f".{fmt}"))
+    try:
+        os.utime(cache_path)
+    except OSError:
+        return None
+    return cache_path
+
+
+def put_disk_page(key, rendered_path):
+    if not page_cache_disk_mb:
+        return rendered_path
+    cache_path = get_page_cache_path(key, os.path.splitext(rendered_path)[1])
+    os.replace(rendered_path, cache_path)
+    return cache_path
+
+
+def trim_page_cache():
+    if not page_cache_disk_mb or not os.path.isdir(PAGE_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(PAGE_CACHE_DIR):
+        try:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            pass
+    total = sum(size for _, size, _ in entries)
+    limit = page_cache_disk_mb * 1024 * 1024
+    for _, size, cache_path in sorted(entries):
+        if total <= limit:
+            break
+        with contextlib.suppress(OSError):
+            os.remove(cache_path)
+        total -= size
+
+
+def apply_contrast(image, factor):
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    histogram = numpy.array(image.convert("L").histogram(), dtype=numpy.float64)
+    mean = int(numpy.dot(histogram, numpy.arange(256)) / histogram.sum() + 0.5)
+    lut = numpy.clip(numpy.round(mean + factor * (numpy.arange(256) - mean)), 0, 255)
+    return image.point(lut.astype(numpy.uint8).tolist() * len(image.getbands()))
 
 
-def rename_files(dir_path):
-    base_name = get_input()
+def get_contrast_factor():
+    try:
+        factor = float(input_text)
+    except (TypeError, ValueError):
+        return 1.25
+    return factor if factor > 0 else 1.25
+
+
+@instrumentation.operation
+def rename_files(dir_path, base_name=None):
+    base_name = base_name or get_input()
     if not base_name:
         return
     files = index_directory(dir_path)
@@ -567,39 +2037,425 @@ def exit_program():
     sys.exit()
 
 
+def run_file_task(task, profile_path=None):
+    func, file_path, args = task
+    measurement = instrumentation.FileMeasurement(file_path, profile_path)
+    try:
+        result, error = func(file_path, *args), None
+    except Exception as exception:
+        result, error = None, f"{type(exception).__name__}: {exception}"
+    return file_path, result, error, measurement.finish(result, error)
+
+
+def record_file_result(task_result, on_result=None):
+    file_path, result, error, event = task_result
+    instrumentation.record_file(file_path, error, event)
+    if on_result is not None:
+        on_result(file_path, result, error)
+    return file_path, result, error
+
+
+def start_worker(settings, initializer=None, initargs=()):
+    # Spawned workers re-import this module, so settings changed after start-up
+    # only reach them when passed in explicitly
+    globals().update(settings)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def process_files(
+    func,
+    file_paths,
+    *args,
+    workers=None,
+    initializer=None,
+    initargs=(),
+    on_result=None,
+):
+    workers = max_workers if workers is None else workers
+    file_paths = iter(file_paths)
+    # Peek at two paths so a single file still skips the pool start-up cost
+    first_paths = list(itertools.islice(file_paths, 2))
+    if not first_paths:
+        instrumentation.record_total(0)
+        return []
+
+    def walk():
+        total = 0
+        for file_path in itertools.chain(first_paths, file_paths):
+            if cancel_event.is_set():
+                break
+            total += 1
+            yield func, file_path, args
+        # The walk streams into the pool, so the total is only known at the end
+        instrumentation.record_total(total)
+
+    tasks = walk()
+    if workers <= 1 or len(first_paths) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [record_file_result(run_file_task(task), on_result) for task in tasks]
+    results = []
+    pending = collections.deque()
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=start_worker,
+        initargs=(settings, initializer, initargs),
+    ) as executor:
+        for task in tasks:
+            profile_path = instrumentation.get_task_profile_path()
+            pending.append(executor.submit(run_file_task, task, profile_path))
+            if len(pending) >= workers * 4:
+                results.append(
+                    record_file_result(pending.popleft().result(), on_result)
+                )
+        while pending:
+            if cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+            future = pending.popleft()
+            if not future.cancelled():
+                results.append(record_file_result(future.result(), on_result))
+    return results
+
+
+def report_results(
+    results, separator="\n", empty_message="No files processed.", skipped=0
+):
+    messages = []
+    for file_path, result, error in results:
+        if error is not None:
+            messages.append(f"Failed: {file_path} ({error})")
+        elif isinstance(result, str):
+            messages.append(result)
+        elif result:
+            messages.extend(f"Created: {output_path}" for output_path in result)
+    if skipped:
+        messages.append(f"Skipped {skipped} unchanged file(s).")
+    if cancel_event.is_set():
+        messages.append("Cancelled before all files were processed.")
+    if status_field:
+        status_field.setText(separator.join(messages) if messages else empty_message)
+
+
+def process_changed_files(
+    operation, directory, prefix, func, file_paths, *args, options=None
+):
+    manifest = RunManifest(directory, operation, args if options is None else options)
+    skipped = 0
+
+    def changed_paths():
+        nonlocal skipped
+        for path in manifest.select(file_paths, prefix, changed_only=False):
+            if not incremental or manifest.is_changed(path):
+                yield path
+            else:
+                skipped += 1
+
+    def record(file_path, outputs, error):
+        if error is None:
+            manifest.record(file_path, outputs if isinstance(outputs, list) else [])
+
+    manifest.start_job()
+    results = process_files(func, changed_paths(), *args, on_result=record)
+    manifest.save()
+    return results, skipped
+
+
+class RunManifest:
+    def __init__(self, directory, operation, options=()):
+        self.directory = directory
+        self.operation = operation
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.journal_path = os.path.join(directory, JOURNAL_NAME)
+        self.data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as manifest_file:
+                    self.data = json.load(manifest_file)
+            except (OSError, ValueError):
+                self.data = {}
+        self.replay_journal()
+        options_key = hashlib.blake2b(repr(options).encode()).hexdigest()
+        self.entry = self.data.get(operation, {})
+        if self.entry.get("options") != options_key:
+            self.entry = {"options": options_key, "files": {}}
+        self.data[operation] = self.entry
+
+    def replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path) as journal_file:
+            for line in journal_file:
+                try:
+                    unit = json.loads(line)
+                    operation, options = unit["operation"], unit["options"]
+                    record = unit["record"] if "key" in unit else None
+                except (ValueError, KeyError, TypeError):
+                    continue
+                entry = self.data.get(operation, {})
+                if entry.get("options") != options or "reset" in unit:
+                    entry = {"options": options, "files": {}}
+                    self.data[operation] = entry
+                if record is not None:
+                    entry["files"][unit["key"]] = record
+
+    def append_journal(self, **unit):
+        unit = {"operation": self.operation, "options": self.entry["options"], **unit}
+        with open(self.journal_path, "a") as journal_file:
+            journal_file.write(json.dumps(unit) + "\n")
+
+    def start_job(self):
+        run = instrumentation.current_run
+        if run is None:
+            return
+        job = {
+            "module": run.func.__module__,
+            "operation": run.name,
+            "args": list(run.args[1:]),
+            "kwargs": run.kwargs,
+            "input_text": str(input_text),
+        }
+        try:
+            get_resumable_operation(job)
+        except ValueError:
+            return
+        with atomic_output(os.path.join(self.directory, JOB_NAME)) as temp_path:
+            with open(temp_path, "w") as job_file:
+                json.dump(job, job_file)
+
+    def key(self, path):
+        return os.path.relpath(path, self.directory)
+
+    def fingerprint(self, path):
+        stat = os.stat(path)
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+        if manifest_hashes:
+            fingerprint.append(hash_file(path))
+        return fingerprint
+
+    def reset(self):
+        self.entry["files"] = {}
+        self.append_journal(reset=True)
+
+    def is_stale(self):
+        return any(
+            not os.path.exists(os.path.join(self.directory, record_path))
+            for record_path in self.entry["files"]
+        )
+
+    def select(self, file_paths, prefix=None, changed_only=True):
+        if not incremental:
+            return iter(file_paths)
+        own_outputs = {
+            output
+            for record in self.entry["files"].values()
+            for output in record["outputs"]
+        }
+        return (
+            path
+            for path in file_paths
+            if self.key(path) not in own_outputs
+            and not (prefix and get_file_name(path).startswith(prefix))
+            and (not changed_only or self.is_changed(path))
+        )
+
+    def is_changed(self, path):
+        record = self.entry["files"].get(self.key(path))
+        if record is None or record["fingerprint"] != self.fingerprint(path):
+            return True
+        return not all(
+            os.path.exists(os.path.join(self.directory, output))
+            for output in record["outputs"]
+        )
+
+    def record(self, path, outputs):
+        key = self.key(path)
+        self.entry["files"][key] = {
+            "fingerprint": self.fingerprint(path),
+            "outputs": [self.key(output) for output in outputs or []],
+        }
+        self.append_journal(key=key, record=self.entry["files"][key])
+
+    def save(self):
+        if not os.path.isdir(self.directory):
+            return
+        with atomic_output(self.path) as temp_path:
+            with open(temp_path, "w") as manifest_file:
+                json.dump(self.data, manifest_file)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        job_path = os.path.join(self.directory, JOB_NAME)
+        if not cancel_event.is_set() and os.path.exists(job_path):
+            os.remove(job_path)
+
+
+def resume_job(dir_path):
+    global input_text, incremental
+    job_path = os.path.join(dir_path, JOB_NAME)
+    if not os.path.exists(job_path):
+        if status_field:
+            status_field.setText("No interrupted job found.")
+        return
+    try:
+        with open(job_path) as job_file:
+            job = json.load(job_file)
+        operation = get_resumable_operation(job)
+        inspect.signature(operation).bind(dir_path, *job["args"], **job["kwargs"])
+    except (OSError, ValueError, TypeError) as error:
+        if status_field:
+            status_field.setText(f"Cannot resume job: {error}")
+        return
+    previous_input, previous_incremental = input_text, incremental
+    input_text, incremental = job["input_text"], True
+    try:
+        operation(dir_path, *job["args"], **job["kwargs"])
+    finally:
+        input_text, incremental = previous_input, previous_incremental
+
+
+def get_resumable_operation(job):
+    if not isinstance(job, dict):
+        raise ValueError("the job file is malformed")
+    module_name, name = job.get("module"), job.get("operation")
+    if name not in RESUMABLE_OPERATIONS.get(module_name, ()):
+        raise ValueError(f"'{module_name}.{name}' is not a resumable operation")
+    args, kwargs = job.get("args"), job.get("kwargs")
+    if not isinstance(args, list) or not isinstance(kwargs, dict):
+        raise ValueError("the job file is malformed")
+    if not isinstance(job.get("input_text"), str) or not all(
+        is_json_scalar(value) for value in args + list(kwargs.values())
+    ):
+        raise ValueError("the job arguments must be plain values")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def is_json_scalar(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+@contextlib.contextmanager
+def atomic_output(output_path):
+    temp_fd, temp_path = tempfile.mkstemp(
+        prefix=f"{CONTROL_PREFIX}tmp_",
+        suffix=os.path.splitext(output_path)[1],
+        dir=get_folder_path(output_path) or ".",
+    )
+    os.close(temp_fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class StreamingPdfWriter:
+    INHERITED_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.offsets = {}
+        self.page_numbers = []
+        self.next_number = 3
+        output_file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def append(self, pdf_data):
+        self.append_pages(pypdf.PdfReader(io.BytesIO(pdf_data)))
+
+    def append_pages(self, reader, pages=None):
+        # Each document's objects are written out immediately and renumbered, so
+        # only the document being appended is ever held in memory. Objects are
+        # relinked in place, so a reader can only be appended once.
+        numbers = {}
+        pending = []
+
+        def renumber(reference):
+            key = (reference.idnum, reference.generation)
+            if reference.get_object().get("/Type") == "/Pages":
+                return pypdf.generic.IndirectObject(2, 0, None)
+            if key not in numbers:
+                numbers[key] = self.next_number
+                self.next_number += 1
+                pending.append(reference)
+            return pypdf.generic.IndirectObject(numbers[key], 0, None)
+
+        def relink(value):
+            if isinstance(value, pypdf.generic.IndirectObject):
+                # Inherited page attributes can share a dictionary that is already done
+                return value if value.pdf is None else renumber(value)
+            if isinstance(value, pypdf.generic.DictionaryObject):
+                for key in list(value):
+                    value[key] = relink(value.raw_get(key))
+            elif isinstance(value, pypdf.generic.ArrayObject):
+                value[:] = [relink(item) for item in value]
+            return value
+
+        for page in reader.pages if pages is None else pages:
+            page_object = page.indirect_reference.get_object()
+            for key in self.INHERITED_KEYS:
+                node = page_object
+                while key not in node and "/Parent" in node:
+                    node = node["/Parent"].get_object()
+                if key in node:
+                    page_object[pypdf.generic.NameObject(key)] = node.raw_get(key)
+            self.page_numbers.append(renumber(page.indirect_reference).idnum)
+        while pending:
+            reference = pending.pop()
+            self.write_object(
+                numbers[(reference.idnum, reference.generation)],
+                relink(reference.get_object()),
+            )
+
+    def write_object(self, number, value):
+        self.offsets[number] = self.output_file.tell()
+        self.output_file.write(f"{number} 0 obj\n".encode())
+        if isinstance(value, bytes):
+            self.output_file.write(value)
+        else:
+            value.write_to_stream(self.output_file)
+        self.output_file.write(b"\nendobj\n")
+
+    def close(self):
+        kids = " ".join(f"{number} 0 R" for number in self.page_numbers)
+        self.write_object(
+            2,
+            f"<< /Type /Pages /Kids [{kids}] "
+            f"/Count {len(self.page_numbers)} >>".encode(),
+        )
+        self.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self.output_file.tell()
+        self.output_file.write(f"xref\n0 {self.next_number}\n".encode())
+        self.output_file.write(b"0000000000 65535 f \n")
+        for number in range(1, self.next_number):
+            self.output_file.write(
+                f"{self.offsets.get(number, 0):010d} 00000 n \n".encode()
+            )
+        self.output_file.write(
+            f"trailer\n<< /Size {self.next_number} /Root 1 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+
+
 def index_directory(path, file_types=None):
-    file_types_filter = False
-    file_types_list = []
+    return list(iter_directory(path, file_types))
+
+
+def iter_directory(path, file_types=None):
     if file_types is None or file_types == "*":
-        file_types_filter = False
+        extensions = None
+    elif isinstance(file_types, list):
+        extensions = file_types
     else:
-        file_types_filter = True
-        if isinstance(file_types, list):
-            file_types_list = [f".{i.lower()}" for i in file_types]
-        else:
-            file_types_list = [f".{str(file_types).lower()}"]
-    file_paths = []
-    for subdir, _, files in os.walk(path):
-        for file in files:
-            if file_types_filter:
-                file_type = f".{file.split('.')[-1].lower()}"
-                if file_type in file_types_list:
-                    file_paths.append(os.path.join(subdir, file))
-            else:
-                file_paths.append(os.path.join(subdir, file))
-    file_paths.sort()
-    return file_paths
+        extensions = [str(file_types)]
+    for entry in indexer.scan_directory(path, extensions, exclude=f"{CONTROL_PREFIX}*"):
+        yield entry.path
 
 
 def get_all_images(directory_path):
-    image_extensions = (".png", ".jpg", ".jpeg")
-    image_files = [
-        os.path.join(root, file)
-        for root, _, files in os.walk(directory_path)
-        for file in files
-        if os.path.splitext(file)[1].lower() in image_extensions
-    ]
-    return image_files
+    return iter_directory(directory_path, ["png", "jpg", "jpeg"])
 
 
 def get_folder_path(path):
@@ -627,70 +2483,89 @@ def get_input():
     return str(input_text) if input_text else False
 
 
-def crop_solid_edges(directory_path):
-    def is_similar(pixel, ref_pixel, threshold=10):
-        return all(abs(a - b) <= threshold for a, b in zip(pixel[:3], ref_pixel[:3]))
-
-    def find_crop_edges(img):
-        width, height = img.size
-        pixels = img.load()
-        top_ref = pixels[0, 0]
-        bottom_ref = pixels[0, height - 1]
-        left_ref = pixels[0, 0]
-        right_ref = pixels[width - 1, 0]
-
-        top = 0
-        for t in range(height):
-            for x in range(width):
-                if not is_similar(pixels[x, t], top_ref):
-                    top = t
-                    break
-            else:
-                continue
-            break
-
-        bottom = height - 1
-        for b in range(height - 1, -1, -1):
-            for x in range(width):
-                if not is_similar(pixels[x, b], bottom_ref):
-                    bottom = b
-                    break
-            else:
-                continue
-            break
-
-        left = 0
-        for left_x in range(width):
-            for y in range(height):
-                if not is_similar(pixels[left_x, y], left_ref):
-                    left = left_x
-                    break
-            else:
-                continue
-            break
-
-        right = width - 1
-        for r in range(width - 1, -1, -1):
-            for y in range(height):
-                if not is_similar(pixels[r, y], right_ref):
-                    right = r
-                    break
-            else:
-                continue
-            break
-
-        return left, top, right + 1, bottom + 1
-
-    results = []
-    for file_path in index_directory(directory_path, file_types=["png", "jpg", "jpeg"]):
-        img = PIL.Image.open(file_path).convert("RGB")
-        crop_box = find_crop_edges(img)
-        cropped = img.crop(crop_box)
-        out_path = os.path.join(
-            directory_path,
-            f"_auto_crop_{strip_ext(get_file_name(file_path))}.{get_file_type(file_path)}",
-        )
-        cropped.save(out_path)
-        results.append(f"Cropped: {out_path}")
-    if status_field:
-        status_field.setText("\n".join(results))
+@instrumentation.operation
+def crop_solid_edges(directory_path, tolerance=None, references=None):
+    if tolerance is None:
+        tolerance = int(input_text) if str(input_text).isdigit() else 10
+    file_paths = iter_directory(directory_path, file_types=["png", "jpg", "jpeg"])
+    results, skipped = process_changed_files(
+        "crop_solid_edges",
+        directory_path,
+        "_auto_crop_",
+        crop_solid_edges_file,
+        file_paths,
+        directory_path,
+        tolerance,
+        references,
+    )
+    report_results(results, skipped=skipped)
+
+
+def crop_solid_edges_file(file_path, directory_path, tolerance=10, references=None):
+    with PIL.Image.open(file_path) as img:
+        with instrumentation.phase("decode"):
+            img.load()
+        with instrumentation.phase("transform"):
+            cropped = crop_solid_edges_image(img, tolerance, references)
+    if get_file_type(file_path).lower() in ("jpg", "jpeg"):
+        cropped = cropped.convert("RGB")
+    out_path = os.path.join(
+        directory_path,
+        f"_auto_crop_{strip_ext(get_file_name(file_path))}.{get_file_type(file_path)}",
+    )
+    with instrumentation.phase("encode"), atomic_output(out_path) as temp_path:
+        cropped.save(temp_path)
+    return [out_path]
+
+
+def crop_solid_edges_image(img, tolerance=10, references=None):
+    has_alpha = "A" in img.getbands() or "transparency" in img.info
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    return img.crop(find_crop_edges(img, tolerance, references))
+
+
+def find_crop_edges(img, tolerance=10, references=None):
+    pixels = numpy.asarray(img).astype(numpy.int16)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    height, width = pixels.shape[:2]
+    edge_refs = {
+        "top": pixels[0, 0],
+        "bottom": pixels[height - 1, 0],
+        "left": pixels[0, 0],
+        "right": pixels[0, width - 1],
+    }
+    for edge, color in (references or {}).items():
+        edge_refs[edge] = numpy.array(color, dtype=numpy.int16)
+    masks = {}
+
+    def differs(edge):
+        ref = edge_refs[edge]
+        key = tuple(int(value) for value in ref)
+        if key not in masks:
+            channels = min(3, len(ref), pixels.shape[2])
+            mask = (
+                numpy.abs(pixels[:, :, :channels] - ref[:channels]).max(axis=2)
+                > tolerance
+            )
+            if pixels.shape[2] == 4:
+                alpha = pixels[:, :, 3]
+                ref_alpha = ref[3] if len(ref) == 4 else 255
+                if ref_alpha == 0:
+                    mask = alpha != 0
+                else:
+                    mask |= numpy.abs(alpha - ref_alpha) > tolerance
+            masks[key] = mask
+        return masks[key]
+
+    rows = differs("top").any(axis=1)
+    top = int(rows.argmax()) if rows.any() else 0
+    rows = differs("bottom").any(axis=1)
+    bottom = height - 1 - int(rows[::-1].argmax()) if rows.any() else height - 1
+    cols = differs("left").any(axis=0)
+    left = int(cols.argmax()) if cols.any() else 0
+    cols = differs("right").any(axis=0)
+    right = width - 1 - int(cols[::-1].argmax()) if cols.any() else width - 1
+    if left > right or top > bottom:
+        return 0, 0, width, height
+    return left, top, right + 1, bottom + 1
@@ -1,17 +1,23 @@
 import json
 import os
 import sys
+import time
 
 import PySide6.QtCore
 import PySide6.QtWidgets
 
 import core as c
+import instrumentation
+import pipeline
 
 # Configuration Management
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(SCRIPT_DIR, "pdf_img_tools_settings.json")
 widget = None
 status_field = None
+job_pool = None
+job_signals = None
+queued_jobs = 0
 current_input_value = ""
 target_directory = ""
 
@@ -55,13 +61,120 @@ def input_box(row_spacing, col_spacing, col_spacing_actual):
     box.show()
 
 
+# Background Jobs
+class JobSignals(PySide6.QtCore.QObject):
+    status = PySide6.QtCore.Signal(str)
+    progress = PySide6.QtCore.Signal(str)
+    finished = PySide6.QtCore.Signal()
+
+
+class SignalStatusField:
+    def setText(self, text):
+        job_signals.status.emit(str(text))
+
+
+class Job(PySide6.QtCore.QRunnable):
+    def __init__(self, label, action, input_value, directory):
+        super().__init__()
+        self.label = label
+        self.action = action
+        self.input_value = input_value
+        self.directory = directory
+        self.done = 0
+        self.total = 0
+        self.start_time = None
+
+    def run(self):
+        c.input_text = self.input_value
+        c.cancel_event.clear()
+        self.start_time = time.monotonic()
+        job_signals.progress.emit(f"{self.label}: started")
+        instrumentation.add_listener(self.on_event)
+        try:
+            self.action(self.directory)
+        except Exception as error:
+            job_signals.status.emit(
+                f"{self.label} failed: {type(error).__name__}: {error}"
+            )
+        finally:
+            instrumentation.remove_listener(self.on_event)
+            elapsed = format_duration(time.monotonic() - self.start_time)
+            state = "cancelled" if c.cancel_event.is_set() else "finished"
+            job_signals.progress.emit(f"{self.label}: {state} after {elapsed}")
+            job_signals.finished.emit()
+
+    def on_event(self, event):
+        if event["event"] == "files_total":
+            self.total += event["total"]
+        elif event["event"] == "file":
+            self.done += 1
+        else:
+            return
+        job_signals.progress.emit(
+            format_progress(
+                self.label, self.done, self.total, time.monotonic() - self.start_time
+            )
+        )
+
+
+def submit_job(label, action):
+    global queued_jobs
+    queued_jobs += 1
+    job_pool.start(Job(label, action, current_input_value, target_directory))
+    update_queue_status()
+
+
+def job_finished():
+    global queued_jobs
+    queued_jobs = max(0, queued_jobs - 1)
+    update_queue_status()
+
+
+def cancel_job():
+    c.cancel_event.set()
+
+
+def cancel_all_jobs():
+    global queued_jobs
+    job_pool.clear()
+    queued_jobs = 1 if job_pool.activeThreadCount() else 0
+    c.cancel_event.set()
+    update_queue_status()
+
+
+def update_queue_status():
+    waiting = max(0, queued_jobs - job_pool.activeThreadCount())
+    widget.setWindowTitle(
+        f"PDF and Image Tools ({waiting} queued)" if waiting else "PDF and Image Tools"
+    )
+
+
+def format_progress(label, done, total, elapsed):
+    rate = done / elapsed if elapsed > 0 else 0
+    text = f"{label}: {done}/{total or '?'} files, {rate:.2f} files/s"
+    if total and rate:
+        text += f", ETA {format_duration(max(0, total - done) / rate)}"
+    return text
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return (
+        f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+    )
+
+
 # UI Element Creation
 def create_button(label, row, col, action, button_type):
     global widget
     bg_color = COLOR_CODES.get(button_type, "#aaaaaa")
     button = PySide6.QtWidgets.QPushButton(widget)
     button.setText(label)
-    button.clicked.connect(action)
+    if button_type == "Settings":
+        button.clicked.connect(action)
+    else:
+        button.clicked.connect(lambda: submit_job(label, action))
     button.setStyleSheet(f"background-color: {bg_color}; color: black;")
     button.move((col - 1) * COL_SPACING, (row - 1) * ROW_SPACING)
     button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
@@ -84,97 +197,108 @@ def create_color_legend_widget():
     return key_widget
 
 
-# Persistent Directory Storage
-def load_last_dir():
+# Persistent Settings Storage
+def load_settings():
     if os.path.exists(CONFIG_PATH):
         with open(CONFIG_PATH) as f:
-            data = json.load(f)
-            return data.get("last_dir", "")
-    return ""
+            return json.load(f)
+    return {}
 
 
-def save_last_dir(path):
+def save_setting(key, value):
+    settings = load_settings()
+    settings[key] = value
     with open(CONFIG_PATH, "w") as f:
-        json.dump({"last_dir": path}, f)
+        json.dump(settings, f)
+
+
+def load_last_dir():
+    return load_settings().get("last_dir", "")
+
+
+def save_last_dir(path):
+    save_setting("last_dir", path)
+
+
+def create_cache_input(label, setting):
+    settings = load_settings()
+    if setting in settings:
+        setattr(c, setting, settings[setting])
+    spin_box = PySide6.QtWidgets.QSpinBox()
+    spin_box.setRange(0, 65536)
+    spin_box.setPrefix(f"{label}: ")
+    spin_box.setSuffix(" MB")
+    spin_box.setValue(getattr(c, setting))
+    spin_box.setToolTip("Rendered page cache size, 0 turns it off")
+
+    def update_cache(value):
+        setattr(c, setting, value)
+        save_setting(setting, value)
+
+    spin_box.valueChanged.connect(update_cache)
+    return spin_box
 
 
 # Main Application Setup
 def run_app():
     global widget, status_field, current_input_value, target_directory
+    global job_pool, job_signals
     app = PySide6.QtWidgets.QApplication(sys.argv)
     widget = PySide6.QtWidgets.QWidget()
     widget.setWindowTitle("PDF and Image Tools")
+    job_pool = PySide6.QtCore.QThreadPool(widget)
+    job_pool.setMaxThreadCount(1)
+    job_signals = JobSignals()
 
     fixed_width = 5 * COL_SPACING - SPACING
-    desired_height = 8 * ROW_SPACING - SPACING
+    desired_height = 10 * ROW_SPACING - SPACING
     widget.setMinimumWidth(fixed_width)
     widget.setMaximumWidth(fixed_width)
     widget.setMinimumHeight(desired_height)
     widget.resize(fixed_width, desired_height)
 
     # PDF Operations
-    create_button("Merge PDFs", 1, 1, lambda: c.merge_pdfs(target_directory), "PDF")
-    create_button("Stitch PDFs", 1, 2, lambda: c.stitch_pdfs(target_directory), "PDF")
-    create_button("Encrypt PDF", 1, 3, lambda: c.encrypt_pdf(target_directory), "PDF")
+    create_button("Merge PDFs", 1, 1, c.merge_pdfs, "PDF")
+    create_button("Stitch PDFs", 1, 2, c.stitch_pdfs, "PDF")
+    create_button("Encrypt PDF", 1, 3, c.encrypt_pdf, "PDF")
     create_button(
         "Save Page Range",
         1,
         4,
-        lambda: c.save_page_range(target_directory, 0, 0),
+        lambda directory: c.save_page_range(directory, 0, 0),
         "PDF",
     )
-    create_button("PDF to Image", 2, 1, lambda: c.pdf_to_image(target_directory), "PDF")
-    create_button(
-        "Enhance Contrast", 2, 2, lambda: c.enhance_contrast(target_directory), "PDF"
-    )
+    create_button("PDF to Image", 2, 1, c.pdf_to_image, "PDF")
+    create_button("Enhance Contrast", 2, 2, c.enhance_contrast, "PDF")
+    create_button("Index PDF Text", 6, 2, c.index_pdf_text, "PDF")
+    create_button("Search PDFs", 7, 1, c.search_pdfs, "PDF")
 
     # Image Operations
-    create_button("Crop Images", 3, 1, lambda: c.crop_images(target_directory), "Image")
-    create_button(
-        "Merge Images", 3, 2, lambda: c.merge_images(target_directory), "Image"
-    )
-    create_button(
-        "Convert PNG ↔️ JPG",
-        3,
-        3,
-        lambda: c.convert_between_png_jpg(target_directory),
-        "Image",
-    )
-    create_button("Image to ICO", 3, 4, lambda: c.img_to_ico(target_directory), "Image")
-    create_button(
-        "Image to PDF", 4, 1, lambda: c.image_to_pdf(target_directory), "Image"
-    )
-    create_button(
-        "Get Image Colors", 4, 2, lambda: c.get_image_colors(target_directory), "Image"
-    )
-    create_button("Crop by 90%", 4, 3, lambda: c.crop_by_90(target_directory), "Image")
-    create_button(
-        "SVG WEBP to PNG",
-        4,
-        4,
-        lambda: c.convert_svg_and_webp_to_png(target_directory),
-        "Image",
-    )
-    create_button(
-        "Crop Solid Edges", 5, 4, lambda: c.crop_solid_edges(target_directory), "Image"
-    )
+    create_button("Crop Images", 3, 1, c.crop_images, "Image")
+    create_button("Merge Images", 3, 2, c.merge_images, "Image")
+    create_button("Convert PNG ↔️ JPG", 3, 3, c.convert_between_png_jpg, "Image")
+    create_button("Image to ICO", 3, 4, c.img_to_ico, "Image")
+    create_button("Image to PDF", 4, 1, c.image_to_pdf, "Image")
+    create_button("Get Image Colors", 4, 2, c.get_image_colors, "Image")
+    create_button("Crop by 90%", 4, 3, c.crop_by_90, "Image")
+    create_button("SVG WEBP to PNG", 4, 4, c.convert_svg_and_webp_to_png, "Image")
+    create_button("Crop Solid Edges", 5, 4, c.crop_solid_edges, "Image")
+    create_button("Near Duplicates", 5, 3, c.near_duplicate_detector, "Image")
 
     # General File Operations
-    create_button("Resave Files", 1, 5, lambda: c.resave_files(target_directory), "Any")
-    create_button("Sanitize", 2, 5, lambda: c.sanitize(target_directory), "Any")
-    create_button("Print Info", 3, 5, lambda: c.print_info(target_directory), "Any")
-    create_button("Rename Files", 4, 5, lambda: c.rename_files(target_directory), "Any")
-    create_button(
-        "Duplicate Detector",
-        5,
-        5,
-        lambda: c.duplicate_detector(target_directory),
-        "Any",
-    )
+    create_button("Resave Files", 1, 5, c.resave_files, "Any")
+    create_button("Sanitize", 2, 5, c.sanitize, "Any")
+    create_button("Print Info", 3, 5, c.print_info, "Any")
+    create_button("Rename Files", 4, 5, c.rename_files, "Any")
+    create_button("Duplicate Detector", 5, 5, c.duplicate_detector, "Any")
+    create_button("Run Pipeline", 6, 1, pipeline.run_pipeline, "Any")
 
     # Program Controls
     create_button("Restart", 5, 1, c.restart_program, "Settings")
     create_button("Quit", 5, 2, c.exit_program, "Settings")
+    create_button("Resume Job", 6, 3, c.resume_job, "Any")
+    create_button("Cancel Job", 6, 4, cancel_job, "Settings")
+    create_button("Cancel All", 6, 5, cancel_all_jobs, "Settings")
 
     # Input Box and Layout
     input_box(ROW_SPACING, COL_SPACING, SPACING)
@@ -184,7 +308,11 @@ def run_app():
     target_directory = last_dir if last_dir else c.ensure_folder("")
 
     status_field = PySide6.QtWidgets.QTextEdit("Program Idle")
-    c.status_field = status_field
+    progress_label = PySide6.QtWidgets.QLabel("No jobs running")
+    job_signals.status.connect(status_field.setText)
+    job_signals.progress.connect(progress_label.setText)
+    job_signals.finished.connect(job_finished)
+    c.status_field = SignalStatusField()
 
     dir_input = PySide6.QtWidgets.QLineEdit()
     dir_input.setText(target_directory)
@@ -204,17 +332,20 @@ def run_app():
 
     dir_row_layout = PySide6.QtWidgets.QHBoxLayout()
     dir_row_layout.addWidget(dir_input)
+    dir_row_layout.addWidget(create_cache_input("Memory cache", "page_cache_memory_mb"))
+    dir_row_layout.addWidget(create_cache_input("Disk cache", "page_cache_disk_mb"))
     dir_row_layout.addStretch()
     dir_row_layout.addWidget(color_key_widget)
 
     spacer = PySide6.QtWidgets.QSpacerItem(
         10,
-        5 * ROW_SPACING,
+        7 * ROW_SPACING,
         PySide6.QtWidgets.QSizePolicy.Policy.Minimum,
         PySide6.QtWidgets.QSizePolicy.Policy.Fixed,
     )
     layout.addSpacerItem(spacer)
     layout.addWidget(status_field)
+    layout.addWidget(progress_label)
     layout.addLayout(dir_row_layout)
 
     widget.setLayout(layout)
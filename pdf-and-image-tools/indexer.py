@@ -0,0 +1,119 @@
+import fnmatch
+import os
+
+SYMLINK_POLICIES = ("files", "follow", "skip")
+
+
+def scan_directory(
+    path,
+    extensions=None,
+    include=None,
+    exclude=None,
+    max_depth=None,
+    symlinks="files",
+    sort=True,
+):
+    if symlinks not in SYMLINK_POLICIES:
+        raise ValueError(f"symlinks must be one of {SYMLINK_POLICIES}")
+    if extensions is not None:
+        extensions = {extension.lower().lstrip(".") for extension in extensions}
+    include = [include] if isinstance(include, str) else include
+    exclude = [exclude] if isinstance(exclude, str) else exclude
+    yield from scan_entries(
+        path,
+        "",
+        0,
+        extensions,
+        include,
+        exclude,
+        max_depth,
+        symlinks,
+        sort,
+        set(),
+    )
+
+
+def scan_entries(
+    path,
+    relative_dir,
+    depth,
+    extensions,
+    include,
+    exclude,
+    max_depth,
+    symlinks,
+    sort,
+    visited,
+):
+    entries = list_entries(path)
+    if sort:
+        entries.sort(
+            key=lambda entry: entry.name + os.sep if is_dir(entry) else entry.name
+        )
+    for entry in entries:
+        relative_path = f"{relative_dir}{entry.name}"
+        if entry.is_symlink() and symlinks == "skip":
+            continue
+        if exclude and matches(entry.name, relative_path, exclude):
+            continue
+        if is_dir(entry):
+            if entry.is_symlink() and symlinks != "follow":
+                continue
+            if max_depth is not None and depth >= max_depth:
+                continue
+            if symlinks == "follow":
+                real_path = os.path.realpath(entry.path)
+                if real_path in visited:
+                    continue
+                visited.add(real_path)
+            yield from scan_entries(
+                entry.path,
+                f"{relative_path}/",
+                depth + 1,
+                extensions,
+                include,
+                exclude,
+                max_depth,
+                symlinks,
+                sort,
+                visited,
+            )
+        elif is_file(entry):
+            if extensions is not None and get_extension(entry.name) not in extensions:
+                continue
+            if include and not matches(entry.name, relative_path, include):
+                continue
+            yield entry
+
+
+def list_entries(path):
+    try:
+        with os.scandir(path) as iterator:
+            return list(iterator)
+    except OSError:
+        return []
+
+
+def is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def is_file(entry):
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
+
+
+def get_extension(name):
+    return name.rsplit(".", 1)[-1].lower()
+
+
+def matches(name, relative_path, patterns):
+    return any(
+        fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+        for pattern in patterns
+    )
@@ -0,0 +1,258 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+log_path = None
+profile_dir = None
+listeners = []
+phase_times = {}
+phase_lock = threading.Lock()
+current_run = None
+
+
+class OperationRun:
+    def __init__(self, func, args=(), kwargs=None):
+        self.func = func
+        self.name = func.__name__
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.pid = os.getpid()
+        self.files = 0
+        self.failed = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.worker_phases = {}
+        self.start_phases = dict(phase_times)
+        self.profile = None
+        self.task_profile_dir = None
+        self.task_count = 0
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            self.task_profile_dir = tempfile.mkdtemp(prefix="_tasks_", dir=profile_dir)
+            self.profile = cProfile.Profile()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = get_cpu_time()
+
+    def add_file(self, event):
+        self.files += 1
+        self.failed += event["status"] == "failed"
+        self.bytes_read += event["bytes_read"]
+        self.bytes_written += event["bytes_written"]
+        if event["pid"] != self.pid:
+            for name, seconds in event["phases"].items():
+                self.worker_phases[name] = self.worker_phases.get(name, 0) + seconds
+
+    def get_task_profile_path(self):
+        if self.task_profile_dir is None:
+            return None
+        self.task_count += 1
+        return os.path.join(self.task_profile_dir, f"{self.task_count}.prof")
+
+    def finish(self, error=None):
+        phases = get_phase_delta(self.start_phases)
+        for name, seconds in self.worker_phases.items():
+            phases[name] = phases.get(name, 0) + seconds
+        event = {
+            "event": "operation_end",
+            "operation": self.name,
+            "status": "ok" if error is None else "failed",
+            "wall_s": time.perf_counter() - self.wall_start,
+            "cpu_s": get_cpu_time() - self.cpu_start,
+            "peak_rss_mb": get_peak_rss_mb(),
+            "files": self.files,
+            "failed": self.failed,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "phases": phases,
+        }
+        if error is not None:
+            event["error"] = f"{type(error).__name__}: {error}"
+        if self.profile is not None:
+            event["profile"] = self.save_profile()
+        return event
+
+    def save_profile(self):
+        stats = pstats.Stats(self.profile)
+        for name in os.listdir(self.task_profile_dir):
+            stats.add(os.path.join(self.task_profile_dir, name))
+        shutil.rmtree(self.task_profile_dir, ignore_errors=True)
+        output_path = os.path.join(
+            profile_dir, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}.prof"
+        )
+        stats.dump_stats(output_path)
+        return output_path
+
+
+class FileMeasurement:
+    def __init__(self, file_path, profile_path=None):
+        self.profile_path = profile_path
+        self.bytes_read = get_size(file_path)
+        self.start_phases = dict(phase_times)
+        self.profile = cProfile.Profile() if profile_path else None
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        if self.profile is not None:
+            self.profile.enable()
+
+    def finish(self, result, error):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.profile_path)
+        outputs = result if isinstance(result, list) else []
+        return {
+            "status": "ok" if error is None else "failed",
+            "wall_s": time.perf_counter() - self.wall_start,
+            "cpu_s": time.process_time() - self.cpu_start,
+            "phases": get_phase_delta(self.start_phases),
+            "bytes_read": self.bytes_read,
+            "bytes_written": sum(
+                get_size(output) for output in outputs if isinstance(output, str)
+            ),
+            "peak_rss_mb": get_peak_rss_mb(),
+            "pid": os.getpid(),
+        }
+
+
+def operation(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global current_run
+        if current_run is not None:
+            return func(*args, **kwargs)
+        run = current_run = OperationRun(func, args, kwargs)
+        emit({"event": "operation_start", "operation": run.name})
+        error = None
+        try:
+            if run.profile is not None:
+                return run.profile.runcall(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        except BaseException as exception:
+            error = exception
+            raise
+        finally:
+            current_run = None
+            emit(run.finish(error))
+
+    return wrapper
+
+
+def get_task_profile_path():
+    return current_run.get_task_profile_path() if current_run else None
+
+
+def record_total(total):
+    event = {"event": "files_total", "total": total}
+    if current_run is not None:
+        event["operation"] = current_run.name
+    emit(event)
+
+
+def record_file(file_path, error, event):
+    event = {"event": "file", "file": file_path, **event}
+    if error is not None:
+        event["error"] = error
+    if current_run is not None:
+        event["operation"] = current_run.name
+        current_run.add_file(event)
+    emit(event)
+
+
+def emit(event):
+    event = {"time": time.time(), **event}
+    for listener in list(listeners):
+        listener(event)
+    if log_path:
+        with open(log_path, "a") as log_file:
+            log_file.write(json.dumps(event) + "\n")
+
+
+def add_listener(callback):
+    listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in listeners:
+        listeners.remove(callback)
+
+
+@contextlib.contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase_time(name, time.perf_counter() - start)
+
+
+def timed(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            add_phase_time(name, time.perf_counter() - start)
+            return
+        add_phase_time(name, time.perf_counter() - start)
+        yield item
+
+
+def add_phase_time(name, seconds):
+    with phase_lock:
+        phase_times[name] = phase_times.get(name, 0) + seconds
+
+
+def get_phase_delta(start_phases):
+    with phase_lock:
+        return {
+            name: seconds - start_phases.get(name, 0)
+            for name, seconds in phase_times.items()
+            if seconds > start_phases.get(name, 0)
+        }
+
+
+def get_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def get_cpu_time():
+    if resource is None:
+        return time.process_time()
+    return sum(
+        usage.ru_utime + usage.ru_stime
+        for usage in (
+            resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN),
+        )
+    )
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.path.exists("/proc/self/status"):
+        # ru_maxrss survives exec on Linux, so it would report the parent's peak
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    self_peak = int(line.split()[1])
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(self_peak, children_peak) / unit
@@ -1,4 +1,7 @@
+import multiprocessing
+
 import gui
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     gui.run_app()
@@ -0,0 +1,255 @@
+import io
+import json
+import os
+import queue
+import threading
+
+import core
+import instrumentation
+
+PREFIX = "_pipe_"
+QUEUE_SIZE = 4
+INPUT_TYPES = ["pdf", "png", "jpg", "jpeg"]
+TRANSFORM_STEPS = ("crop_solid_edges", "crop_by_90", "contrast", "grayscale")
+OUTPUT_STEPS = ("images", "pdf")
+DONE = object()
+
+
+@instrumentation.operation
+def run_pipeline(path, spec=None):
+    try:
+        steps, queue_size = load_pipeline(spec or core.input_text)
+    except (OSError, ValueError) as error:
+        if core.status_field:
+            core.status_field.setText(f"Invalid pipeline: {error}")
+        return
+    if steps[-1][0] == "pdf" and core.img2pdf is None:
+        if core.status_field:
+            core.status_field.setText("img2pdf is not installed.")
+        return
+    results, skipped = core.process_changed_files(
+        "pipeline",
+        path,
+        PREFIX,
+        run_pipeline_file,
+        core.iter_directory(path, INPUT_TYPES),
+        path,
+        steps,
+        queue_size,
+        options=(path, steps),
+    )
+    core.report_results(results, skipped=skipped)
+
+
+def load_pipeline(spec):
+    spec = str(spec).strip()
+    queue_size = QUEUE_SIZE
+    if spec.lower().endswith(".json") and os.path.isfile(spec):
+        with open(spec) as config_file:
+            config = json.load(config_file)
+        if isinstance(config, dict):
+            queue_size = int(config.get("queue_size", QUEUE_SIZE))
+            config = config.get("steps", [])
+        steps = [parse_step(step) for step in config]
+    else:
+        steps = [parse_step(part) for part in spec.split("|") if part.strip()]
+    validate_steps(steps)
+    return steps, max(1, queue_size)
+
+
+def parse_step(step):
+    if isinstance(step, dict):
+        options = dict(step)
+        name = options.pop("step", "")
+        return str(name).lower(), options
+    name, *tokens = str(step).split()
+    options = {}
+    for token in tokens:
+        key, separator, value = token.partition("=")
+        if not separator:
+            raise ValueError(f"expected key=value, got '{token}'")
+        options[key.lower()] = parse_value(value)
+    return name.lower(), options
+
+
+def parse_value(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+
+def validate_steps(steps):
+    if not steps or steps[-1][0] not in OUTPUT_STEPS:
+        raise ValueError(f"the last step must be one of {', '.join(OUTPUT_STEPS)}")
+    for index, (name, _) in enumerate(steps[:-1]):
+        if name == "render" and index == 0:
+            continue
+        if name not in TRANSFORM_STEPS:
+            raise ValueError(f"unknown or misplaced step '{name}'")
+
+
+def run_pipeline_file(file_path, path, steps, queue_size=QUEUE_SIZE):
+    render_options = steps[0][1] if steps[0][0] == "render" else {}
+    transforms = [get_transform(name, options) for name, options in steps[:-1]]
+    transforms = [transform for transform in transforms if transform is not None]
+    output_name, output_options = steps[-1]
+    if core.get_file_type(file_path).lower() == "pdf":
+        page_count = core.pdf2image.pdfinfo_from_path(file_path)["Pages"]
+        images = enumerate(
+            instrumentation.timed(
+                core.render_pdf_pages(
+                    file_path,
+                    render_options.get("dpi", 200),
+                    render_options.get("grayscale", False),
+                    page_count,
+                ),
+                "decode",
+            ),
+            start=1,
+        )
+    else:
+        page_count = None
+        images = [(None, open_image(file_path))]
+    pages = run_stages(images, transforms, queue_size)
+    if output_name == "pdf":
+        return save_pdf(pages, file_path, path, **output_options)
+    return save_images(pages, file_path, path, page_count, **output_options)
+
+
+def get_transform(name, options):
+    if name == "crop_solid_edges":
+        tolerance = options.get("tolerance", 10)
+        return lambda image: core.crop_solid_edges_image(image, tolerance)
+    if name == "crop_by_90":
+        return core.crop_by_90_image
+    if name == "contrast":
+        factor = options.get("factor", 1.25)
+        return lambda image: core.apply_contrast(image, factor)
+    if name == "grayscale":
+        return lambda image: image.convert("L")
+    return None
+
+
+def open_image(file_path):
+    with instrumentation.phase("decode"), core.PIL.Image.open(file_path) as image:
+        image.load()
+        return image
+
+
+def run_stages(items, transforms, queue_size=QUEUE_SIZE):
+    queues = [queue.Queue(queue_size) for _ in range(len(transforms) + 1)]
+    stop = threading.Event()
+    errors = []
+
+    def put(target, item):
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(source):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return DONE
+
+    def feed():
+        try:
+            for item in items:
+                if not put(queues[0], item):
+                    break
+        except Exception as error:
+            errors.append(error)
+        finally:
+            put(queues[0], DONE)
+
+    def work(transform, inbound, outbound):
+        try:
+            while (item := get(inbound)) is not DONE:
+                page, image = item
+                with instrumentation.phase("transform"):
+                    image = transform(image)
+                if not put(outbound, (page, image)):
+                    break
+        except Exception as error:
+            errors.append(error)
+        finally:
+            put(outbound, DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for index, transform in enumerate(transforms):
+        threads.append(
+            threading.Thread(
+                target=work,
+                args=(transform, queues[index], queues[index + 1]),
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+    try:
+        while (item := get(queues[-1])) is not DONE:
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def save_images(pages, file_path, path, page_count=None, fmt=None, quality=None):
+    extension = fmt or ("png" if page_count else core.get_file_type(file_path))
+    fmt = "jpeg" if extension.lower() == "jpg" else extension.lower()
+    padding = core.get_padding(page_count or 1)
+    name = core.strip_ext(core.get_file_name(file_path))
+    output_paths = []
+    for page, image in pages:
+        suffix = f" {str(page).zfill(padding)}" if page is not None else ""
+        output_path = os.path.join(path, f"{PREFIX}{name}{suffix}.{extension}")
+        if fmt == "jpeg" and image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        save_options = {} if quality is None else {"quality": quality}
+        with (
+            instrumentation.phase("encode"),
+            core.atomic_output(output_path) as temp_path,
+        ):
+            image.save(temp_path, format=fmt.upper(), **save_options)
+        output_paths.append(output_path)
+    return output_paths
+
+
+def save_pdf(pages, file_path, path, quality=None, page_size=None, fit=None):
+    def encoded_pages():
+        for _, image in pages:
+            if image.mode not in ("L", "RGB"):
+                image = image.convert("RGB")
+            byte_io = io.BytesIO()
+            with instrumentation.phase("encode"):
+                if quality is None:
+                    image.save(byte_io, format="PNG")
+                else:
+                    image.save(byte_io, format="JPEG", quality=quality)
+            yield byte_io.getvalue()
+
+    output_path = os.path.join(
+        path, f"{PREFIX}{core.strip_ext(core.get_file_name(file_path))}.pdf"
+    )
+    with core.atomic_output(output_path) as temp_path, open(temp_path, "wb") as file:
+        core.write_pdf_in_chunks(
+            file,
+            encoded_pages(),
+            core.RENDER_CHUNK_PAGES,
+            core.get_image_layout(page_size, fit),
+        )
+    return [output_path]
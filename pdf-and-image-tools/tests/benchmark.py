@@ -0,0 +1,348 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(TESTS_DIR))
+sys.path.append(TESTS_DIR)
+import core
+import generate_test_assets
+import instrumentation
+import pipeline
+
+CORPUS_DIR = os.path.join(TESTS_DIR, "data", "benchmark")
+COMPLETE_MARKER = ".complete"
+SIZES = {
+    "small": {
+        "pdfs": 20,
+        "long_pdf": 50,
+        "large_images": 4,
+        "screenshots": 50,
+        "tiles": 9,
+        "duplicates": 25,
+        "vectors": 10,
+    },
+    "medium": {
+        "pdfs": 200,
+        "long_pdf": 250,
+        "large_images": 16,
+        "screenshots": 500,
+        "tiles": 36,
+        "duplicates": 250,
+        "vectors": 100,
+    },
+    "large": {
+        "pdfs": 1000,
+        "long_pdf": 1000,
+        "large_images": 50,
+        "screenshots": 3000,
+        "tiles": 100,
+        "duplicates": 1000,
+        "vectors": 500,
+    },
+}
+OPERATIONS = {
+    "merge_pdfs": ("pdfs", lambda path: core.merge_pdfs(path)),
+    "stitch_pdfs": ("pdfs", lambda path: core.stitch_pdfs(path)),
+    "encrypt_pdf": ("pdfs", lambda path: core.encrypt_pdf(path, "benchmark")),
+    "save_page_range": (
+        "long_pdf",
+        lambda path: core.save_page_range(path, ranges="every 10"),
+    ),
+    "pdf_to_image": ("long_pdf", lambda path: core.pdf_to_image(path)),
+    "enhance_contrast": ("pdfs", lambda path: core.enhance_contrast(path)),
+    "resave_files": ("pdfs", lambda path: core.resave_files(path)),
+    "crop_images": ("screenshots", lambda path: core.crop_images(path)),
+    "convert_between_png_jpg": (
+        "screenshots",
+        lambda path: core.convert_between_png_jpg(path),
+    ),
+    "image_to_pdf": ("screenshots", lambda path: core.image_to_pdf(path)),
+    "sanitize": ("screenshots", lambda path: core.sanitize(path)),
+    "rename_files": ("screenshots", lambda path: core.rename_files(path, "bench")),
+    "pipeline": (
+        "screenshots",
+        lambda path: pipeline.run_pipeline(path, "crop_solid_edges | pdf quality=85"),
+    ),
+    "merge_images": ("tiles", lambda path: core.merge_images(path)),
+    "img_to_ico": ("tiles", lambda path: core.img_to_ico(path)),
+    "get_image_colors": ("large_images", lambda path: core.get_image_colors(path)),
+    "crop_by_90": ("large_images", lambda path: core.crop_by_90(path)),
+    "crop_solid_edges": ("large_images", lambda path: core.crop_solid_edges(path)),
+    "print_info": ("duplicates", lambda path: core.print_info(path)),
+    "duplicate_detector": ("duplicates", lambda path: core.duplicate_detector(path)),
+    "near_duplicate_detector": (
+        "duplicates",
+        lambda path: core.near_duplicate_detector(path),
+    ),
+    "convert_svg_and_webp_to_png": (
+        "vectors",
+        lambda path: core.convert_svg_and_webp_to_png(path),
+    ),
+}
+
+
+class RecordingStatusField:
+    def __init__(self):
+        self.messages = []
+
+    def setText(self, text):
+        self.messages.append(str(text))
+
+
+def get_skip_reason(operation):
+    if operation in ("pdf_to_image", "enhance_contrast") and not shutil.which(
+        "pdftoppm"
+    ):
+        return "Poppler (pdftoppm) not found in PATH"
+    if operation in ("image_to_pdf", "enhance_contrast", "pipeline") and (
+        core.img2pdf is None
+    ):
+        return "img2pdf is not installed"
+    if operation == "convert_svg_and_webp_to_png" and not (
+        core.playwright or core.get_cairosvg()
+    ):
+        return "neither cairosvg nor playwright is installed"
+    return None
+
+
+def build_corpus(corpus, scale):
+    corpus_path = os.path.join(CORPUS_DIR, f"{corpus}_{scale}")
+    if os.path.exists(os.path.join(corpus_path, COMPLETE_MARKER)):
+        return corpus_path
+    if os.path.exists(corpus_path):
+        shutil.rmtree(corpus_path)
+    if corpus == "pdfs":
+        generate_test_assets.generate_test_pdfs(corpus_path, scale)
+    elif corpus == "long_pdf":
+        generate_test_assets.generate_long_pdf(
+            os.path.join(corpus_path, "long.pdf"), scale
+        )
+    elif corpus == "large_images":
+        generate_test_assets.generate_large_images(corpus_path, scale)
+    elif corpus == "screenshots":
+        generate_test_assets.generate_screenshots(corpus_path, scale)
+    elif corpus == "tiles":
+        generate_test_assets.generate_screenshots(corpus_path, scale, (320, 240))
+    elif corpus == "duplicates":
+        generate_test_assets.generate_duplicate_tree(corpus_path, scale)
+    elif corpus == "vectors":
+        generate_test_assets.generate_vector_images(corpus_path, scale)
+    open(os.path.join(corpus_path, COMPLETE_MARKER), "w").close()
+    return corpus_path
+
+
+def measure(operation, corpus_path, workers=None):
+    with tempfile.TemporaryDirectory(prefix="pdf_img_bench_") as temp_dir:
+        workspace = os.path.join(temp_dir, "corpus")
+        shutil.copytree(
+            corpus_path, workspace, ignore=shutil.ignore_patterns(COMPLETE_MARKER)
+        )
+        core.incremental = False
+        # Repeats would otherwise time cache hits instead of rendering
+        core.page_cache_memory_mb = core.page_cache_disk_mb = 0
+        core.status_field = RecordingStatusField()
+        if workers:
+            core.max_workers = workers
+        events = []
+        instrumentation.add_listener(events.append)
+        wall_start = time.perf_counter()
+        cpu_start = instrumentation.get_cpu_time()
+        OPERATIONS[operation][1](workspace)
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = instrumentation.get_cpu_time() - cpu_start
+    operation_events = [event for event in events if event["event"] == "operation_end"]
+    return {
+        "wall_s": wall_time,
+        "cpu_s": cpu_time,
+        "peak_rss_mb": instrumentation.get_peak_rss_mb(),
+        "failures": sum(
+            message.count("Failed: ") for message in core.status_field.messages
+        ),
+        "phases": operation_events[-1]["phases"] if operation_events else {},
+    }
+
+
+def get_corpus_stats(corpus_path):
+    files = 0
+    total_bytes = 0
+    for root, _, names in os.walk(corpus_path):
+        for name in names:
+            if name != COMPLETE_MARKER:
+                files += 1
+                total_bytes += os.path.getsize(os.path.join(root, name))
+    return files, total_bytes
+
+
+def run_benchmarks(operations, sizes, repeat=3, workers=None):
+    results = []
+    for size in sizes:
+        for operation in operations:
+            corpus, _ = OPERATIONS[operation]
+            result = {"operation": operation, "size": size, "corpus": corpus}
+            results.append(result)
+            skip_reason = get_skip_reason(operation)
+            if skip_reason:
+                result["skipped"] = skip_reason
+                print(f"{operation} [{size}]: skipped ({skip_reason})")
+                continue
+            corpus_path = build_corpus(corpus, SIZES[size][corpus])
+            result["files"], result["bytes"] = get_corpus_stats(corpus_path)
+            command = [sys.executable, os.path.abspath(__file__), "measure"]
+            command += [operation, corpus_path]
+            if workers:
+                command += ["--workers", str(workers)]
+            runs = []
+            for _ in range(repeat):
+                process = subprocess.run(command, capture_output=True, text=True)
+                if process.returncode != 0:
+                    result["error"] = process.stderr.strip().splitlines()[-1:]
+                    break
+                runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+            if runs:
+                result["runs"] = runs
+                result["wall_s"] = statistics.median(run["wall_s"] for run in runs)
+                result["cpu_s"] = statistics.median(run["cpu_s"] for run in runs)
+                rss_values = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"]]
+                result["peak_rss_mb"] = max(rss_values) if rss_values else None
+                result["failures"] = max(run["failures"] for run in runs)
+                result["phases"] = {
+                    name: statistics.median(run["phases"].get(name, 0) for run in runs)
+                    for name in sorted({name for run in runs for name in run["phases"]})
+                }
+                print(
+                    f"{operation} [{size}]: {result['wall_s']:.3f}s wall, "
+                    f"{result['cpu_s']:.3f}s CPU, "
+                    f"{format_rss(result['peak_rss_mb'])} peak RSS"
+                )
+            else:
+                print(f"{operation} [{size}]: error ({' '.join(result['error'])})")
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": workers or core.max_workers,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def format_rss(peak_rss_mb):
+    return "n/a" if peak_rss_mb is None else f"{peak_rss_mb:.1f} MB"
+
+
+def compare_results(baseline, current, threshold=0.1, min_seconds=0.05, min_mb=5):
+    previous_results = {
+        (result["operation"], result["size"]): result for result in baseline["results"]
+    }
+    rows = []
+    for result in current["results"]:
+        previous = previous_results.get((result["operation"], result["size"]))
+        if previous is None:
+            continue
+        for metric, noise in (
+            ("wall_s", min_seconds),
+            ("cpu_s", min_seconds),
+            ("peak_rss_mb", min_mb),
+        ):
+            before = previous.get(metric)
+            after = result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = change > threshold and after - before > noise
+            rows.append(
+                (
+                    result["operation"],
+                    result["size"],
+                    metric,
+                    before,
+                    after,
+                    change,
+                    regressed,
+                )
+            )
+    return rows
+
+
+def print_comparison(rows):
+    for operation, size, metric, before, after, change, regressed in rows:
+        flag = "REGRESSION" if regressed else "ok"
+        print(
+            f"{operation:<28} {size:<7} {metric:<12} {before:>10.3f} "
+            f"{after:>10.3f} {change:>+8.1%}  {flag}"
+        )
+    regressions = sum(row[-1] for row in rows)
+    print(f"{regressions} regression(s) in {len(rows)} comparison(s)")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark PDF and Image Tools operations on synthetic corpora."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time operations and write JSON")
+    run_parser.add_argument(
+        "--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS)
+    )
+    run_parser.add_argument(
+        "--sizes", nargs="+", choices=list(SIZES), default=["small"]
+    )
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--workers", type=int)
+    run_parser.add_argument("--output")
+    run_parser.add_argument("--baseline", help="compare against a previous run")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    measure_parser = commands.add_parser("measure")
+    measure_parser.add_argument("operation", choices=list(OPERATIONS))
+    measure_parser.add_argument("corpus_path")
+    measure_parser.add_argument("--workers", type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == "measure":
+        print(json.dumps(measure(args.operation, args.corpus_path, args.workers)))
+        return 0
+    if args.command == "compare":
+        rows = compare_results(
+            load_results(args.baseline), load_results(args.current), args.threshold
+        )
+        return 1 if print_comparison(rows) else 0
+
+    results = run_benchmarks(args.operations, args.sizes, args.repeat, args.workers)
+    output_path = args.output or os.path.join(
+        CORPUS_DIR, f"results_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results written to {output_path}")
+    if args.baseline:
+        rows = compare_results(load_results(args.baseline), results, args.threshold)
+        return 1 if print_comparison(rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
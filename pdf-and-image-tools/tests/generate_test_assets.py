@@ -1,4 +1,6 @@
+import io
 import os
+import shutil
 
 import img2pdf
 import PIL.Image
@@ -71,5 +73,150 @@ def generate_test_pdfs(
     print(f"Generated {total_files} test PDFs in {output_directory}")
 
 
+def generate_long_pdf(
+    output_path="pdf-and-image-tools/tests/data/assets/long.pdf", total_pages=1000
+):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    font = get_ocr_friendly_font(60)
+    pages = []
+    for index in range(1, total_pages + 1):
+        canvas = PIL.Image.new("L", (400, 500), color="white")
+        draw_context = PIL.ImageDraw.Draw(canvas)
+        label_text = str(index)
+        text_position = calculate_centered_text_position(
+            draw_context, label_text, font, *canvas.size
+        )
+        draw_context.text(text_position, label_text, fill=0, font=font)
+        byte_io = io.BytesIO()
+        canvas.save(byte_io, format="PNG")
+        pages.append(byte_io.getvalue())
+
+    with open(output_path, "wb") as pdf_file:
+        pdf_file.write(img2pdf.convert(pages))
+
+    print(f"Generated a {total_pages} page PDF at {output_path}")
+
+
+def generate_large_images(
+    output_directory="pdf-and-image-tools/tests/data/assets/large",
+    megapixels=50,
+    total_files=2,
+):
+    os.makedirs(output_directory, exist_ok=True)
+
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = megapixels * 1_000_000 // width
+    border = max(1, width // 40)
+    inner_size = (width - 2 * border, height - 2 * border)
+
+    for index in range(1, total_files + 1):
+        channels = [
+            PIL.Image.linear_gradient("L").resize(inner_size),
+            PIL.Image.radial_gradient("L").resize(inner_size),
+            PIL.Image.linear_gradient("L").rotate(90 * index).resize(inner_size),
+        ]
+        canvas = PIL.Image.new("RGB", (width, height), color="white")
+        canvas.paste(PIL.Image.merge("RGB", channels), (border, border))
+        canvas.save(
+            os.path.join(output_directory, f"large_{index:02d}.jpg"), quality=90
+        )
+
+    print(f"Generated {total_files} {megapixels} MP images in {output_directory}")
+
+
+def generate_screenshots(
+    output_directory="pdf-and-image-tools/tests/data/assets/screenshots",
+    total_files=1000,
+    size=(1280, 1080),
+):
+    os.makedirs(output_directory, exist_ok=True)
+
+    canvas_width, canvas_height = size
+    font = PIL.ImageFont.load_default()
+
+    for index in range(1, total_files + 1):
+        accent = (index * 37 % 256, index * 91 % 256, index * 53 % 256)
+        canvas = PIL.Image.new("RGB", size, color=(240, 240, 240))
+        draw_context = PIL.ImageDraw.Draw(canvas)
+        draw_context.rectangle((0, 0, canvas_width, canvas_height // 20), fill=accent)
+        for line in range(index % 7 + 3):
+            top = canvas_height // 10 + line * canvas_height // 12
+            draw_context.rectangle(
+                (canvas_width // 20, top, canvas_width * (line + 4) // 12, top + 12),
+                fill=(60, 60, 60),
+            )
+            draw_context.text(
+                (canvas_width // 20, top + 16),
+                f"Screenshot {index} line {line}",
+                fill=accent,
+                font=font,
+            )
+        canvas.save(os.path.join(output_directory, f"screenshot_{index:05d}.png"))
+
+    print(f"Generated {total_files} screenshots in {output_directory}")
+
+
+def generate_duplicate_tree(
+    output_directory="pdf-and-image-tools/tests/data/assets/duplicates",
+    unique_files=250,
+    copies=3,
+    depth=3,
+):
+    os.makedirs(output_directory, exist_ok=True)
+
+    for index in range(1, unique_files + 1):
+        canvas = PIL.Image.new("RGB", (256, 256), color="white")
+        draw_context = PIL.ImageDraw.Draw(canvas)
+        draw_context.ellipse(
+            (index % 97, index % 89, 160 + index % 83, 160 + index % 79),
+            fill=(index * 37 % 256, index * 91 % 256, index * 53 % 256),
+        )
+        source_path = os.path.join(output_directory, f"original_{index:05d}.png")
+        canvas.save(source_path)
+
+        for copy_index in range(1, copies + 1):
+            copy_directory = os.path.join(
+                output_directory,
+                *(
+                    f"level_{level}_{(index + copy_index) % 4}"
+                    for level in range(depth)
+                ),
+            )
+            os.makedirs(copy_directory, exist_ok=True)
+            shutil.copyfile(
+                source_path,
+                os.path.join(copy_directory, f"copy_{index:05d}_{copy_index}.png"),
+            )
+        canvas.resize((200, 200)).save(
+            os.path.join(output_directory, f"resized_{index:05d}.jpg"), quality=85
+        )
+
+    print(
+        f"Generated {unique_files} images with {copies} copies each in {output_directory}"
+    )
+
+
+def generate_vector_images(
+    output_directory="pdf-and-image-tools/tests/data/assets/vectors", total_files=100
+):
+    os.makedirs(output_directory, exist_ok=True)
+
+    for index in range(1, total_files + 1):
+        color = f"#{index * 37 % 256:02x}{index * 91 % 256:02x}{index * 53 % 256:02x}"
+        with open(
+            os.path.join(output_directory, f"vector_{index:04d}.svg"), "w"
+        ) as file:
+            file.write(
+                '<svg xmlns="http://www.w3.org/2000/svg" width="640" height="480">'
+                '<rect width="640" height="480" fill="white"/>'
+                f'<circle cx="{160 + index % 320}" cy="240" r="120" fill="{color}"/>'
+                f'<text x="40" y="440" font-size="48">{index}</text></svg>'
+            )
+        canvas = PIL.Image.new("RGB", (640, 480), color=color)
+        canvas.save(os.path.join(output_directory, f"photo_{index:04d}.webp"))
+
+    print(f"Generated {total_files} SVG and WebP files in {output_directory}")
+
+
 if __name__ == "__main__":
     generate_test_pdfs()
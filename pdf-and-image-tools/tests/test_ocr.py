@@ -1,15 +1,24 @@
+import concurrent.futures
+import functools
+import io
+import multiprocessing
 import os
 import shutil
 import sys
 
-import pdf2image
+import img2pdf
 import PIL.Image
+import pypdf
 import pytest
 import pytesseract
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import cli
 import core
-
+import indexer
+import instrumentation
+import pipeline
 
 ASSETS_DIR = "pdf-and-image-tools/tests/data/assets"
 OUTPUT_DIR = "pdf-and-image-tools/tests/data/output"
@@ -36,6 +45,34 @@ def prepare_test_output_directory():
     yield
 
 
+class StatusCapturer:
+    def __init__(self):
+        self.captured_text = ""
+
+    def setText(self, text):
+        self.captured_text = text
+
+
+@pytest.fixture(autouse=True)
+def status(monkeypatch):
+    capturer = StatusCapturer()
+    monkeypatch.setattr(core, "status_field", capturer)
+    monkeypatch.setattr(core, "input_text", "")
+    monkeypatch.setattr(core, "incremental", True)
+    return capturer
+
+
+@pytest.fixture(autouse=True)
+def isolate_cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(
+        core, "HASH_CACHE_PATH", str(tmp_path / "cache" / "hashes.sqlite3")
+    )
+    monkeypatch.setattr(core, "PAGE_CACHE_DIR", str(tmp_path / "cache" / "pages"))
+    monkeypatch.setattr(core, "page_cache", core.collections.OrderedDict())
+    monkeypatch.setattr(core, "page_cache_bytes", 0)
+
+
 def ensure_tesseract_is_available():
     if not shutil.which("tesseract"):
         pytest.skip(
@@ -57,7 +94,7 @@ def find_single_generated_file(directory, filename_prefix):
 
 
 def verify_pdf_pages_contain_sequential_numbers(pdf_path, expected_page_count):
-    images = pdf2image.convert_from_path(pdf_path, dpi=300)
+    images = list(core.render_pdf_pages(pdf_path, 300))
     assert len(images) == expected_page_count
 
     validation_errors = []
@@ -85,6 +122,28 @@ def test_pdf_merging_and_ocr_verification():
     verify_pdf_pages_contain_sequential_numbers(merged_pdf_path, expected_page_count=10)
 
 
+def test_pdf_merging_in_page_limited_parts(monkeypatch):
+    merge_workspace = os.path.join(OUTPUT_DIR, "merge_parts_test")
+    populate_directory_with_test_pdfs(merge_workspace)
+
+    monkeypatch.setattr(core, "input_text", "4p")
+    core.merge_pdfs(merge_workspace)
+
+    part_paths = sorted(
+        f for f in os.listdir(merge_workspace) if f.startswith("_merged_")
+    )
+    assert part_paths == [
+        "_merged_test_01_part01.pdf",
+        "_merged_test_01_part02.pdf",
+        "_merged_test_01_part03.pdf",
+    ]
+    page_counts = [
+        len(core.pypdf.PdfReader(os.path.join(merge_workspace, path)).pages)
+        for path in part_paths
+    ]
+    assert page_counts == [4, 4, 2]
+
+
 def create_composite_pdf(output_path, page_numbers):
     writer = core.pypdf.PdfWriter()
     for num in page_numbers:
@@ -103,7 +162,9 @@ def create_composite_pdf(output_path, page_numbers):
         ("8-", ["8", "9", "10"]),
     ],
 )
-def test_pdf_page_range_extraction_variants(range_expression, expected_labels):
+def test_pdf_page_range_extraction_variants(
+    range_expression, expected_labels, monkeypatch
+):
     range_workspace = os.path.join(
         OUTPUT_DIR, f"range_{range_expression.replace('-', 'to')}"
     )
@@ -112,11 +173,11 @@ def test_pdf_page_range_extraction_variants(range_expression, expected_labels):
     source_pdf_path = os.path.join(range_workspace, "multi.pdf")
     create_composite_pdf(source_pdf_path, range(1, 11))
 
-    core.input_text = range_expression
+    monkeypatch.setattr(core, "input_text", range_expression)
     core.save_page_range(range_workspace, 0, 0)
 
     result_pdf_path = find_single_generated_file(range_workspace, "_range_")
-    result_images = pdf2image.convert_from_path(result_pdf_path, dpi=300)
+    result_images = list(core.render_pdf_pages(result_pdf_path, 300))
 
     assert len(result_images) == len(expected_labels)
     for i, expected_text in enumerate(expected_labels):
@@ -124,6 +185,53 @@ def test_pdf_page_range_extraction_variants(range_expression, expected_labels):
         assert expected_text in detected_text
 
 
+def test_pdf_multi_range_extraction_in_one_pass(monkeypatch):
+    range_workspace = os.path.join(OUTPUT_DIR, "multi_range")
+    os.makedirs(range_workspace, exist_ok=True)
+    create_composite_pdf(os.path.join(range_workspace, "multi.pdf"), range(1, 11))
+
+    monkeypatch.setattr(core, "input_text", "1-3, 7, 9-, every 5")
+    core.save_page_range(range_workspace, 0, 0)
+
+    outputs = sorted(f for f in os.listdir(range_workspace) if f.startswith("_range_"))
+    assert outputs == [
+        "_range_01-03_multi.pdf",
+        "_range_01-05_multi.pdf",
+        "_range_06-10_multi.pdf",
+        "_range_07-07_multi.pdf",
+        "_range_09-10_multi.pdf",
+    ]
+    page_counts = [
+        len(core.pypdf.PdfReader(os.path.join(range_workspace, f)).pages)
+        for f in outputs
+    ]
+    assert page_counts == [3, 5, 5, 1, 2]
+
+
+def test_pdf_to_image_renders_pages_in_chunks(monkeypatch):
+    render_workspace = os.path.join(OUTPUT_DIR, "render_chunks")
+    os.makedirs(render_workspace, exist_ok=True)
+    create_composite_pdf(os.path.join(render_workspace, "multi.pdf"), range(1, 6))
+
+    rendered_ranges = []
+    convert_from_path = core.pdf2image.convert_from_path
+
+    def record_range(*args, **kwargs):
+        rendered_ranges.append((kwargs["first_page"], kwargs["last_page"]))
+        return convert_from_path(*args, **kwargs)
+
+    monkeypatch.setattr(core.pdf2image, "convert_from_path", record_range)
+    monkeypatch.setattr(core, "RENDER_CHUNK_PAGES", 2)
+    core.pdf_to_image(render_workspace, dpi=50, fmt="jpeg")
+
+    assert rendered_ranges == [(1, 2), (3, 4), (5, 5)]
+    outputs = sorted(f for f in os.listdir(render_workspace) if f.startswith("_img_"))
+    assert outputs == [f"_img_multi {page:02d}.jpg" for page in range(1, 6)]
+    for output in outputs:
+        with PIL.Image.open(os.path.join(render_workspace, output)) as image:
+            assert image.format == "JPEG"
+
+
 def test_pdf_stitching_functionality():
     stitch_workspace = os.path.join(OUTPUT_DIR, "stitch_test")
     os.makedirs(stitch_workspace, exist_ok=True)
@@ -134,7 +242,7 @@ def test_pdf_stitching_functionality():
     core.stitch_pdfs(stitch_workspace)
 
     vertical_stitch_path = find_single_generated_file(stitch_workspace, "_v_stitch_")
-    stitched_images = pdf2image.convert_from_path(vertical_stitch_path, dpi=300)
+    stitched_images = list(core.render_pdf_pages(vertical_stitch_path, 300))
 
     assert len(stitched_images) == 1
 
@@ -145,11 +253,101 @@ def test_pdf_stitching_functionality():
     assert "2" in page_text
 
 
-def test_batch_file_renaming_logic():
+def test_pdf_grid_stitching_reuses_page_xobjects(monkeypatch):
+    stitch_workspace = os.path.join(OUTPUT_DIR, "stitch_grid_test")
+    os.makedirs(stitch_workspace, exist_ok=True)
+    create_composite_pdf(os.path.join(stitch_workspace, "to_stitch.pdf"), [1, 2, 3])
+
+    monkeypatch.setattr(core, "input_text", "grid2 gap10")
+    core.stitch_pdfs(stitch_workspace)
+
+    grid_path = find_single_generated_file(stitch_workspace, "_g_stitch_")
+    source_page = core.pypdf.PdfReader(
+        os.path.join(stitch_workspace, "to_stitch.pdf")
+    ).pages[0]
+    grid_page = core.pypdf.PdfReader(grid_path).pages[0]
+
+    assert float(grid_page.mediabox.width) == 2 * float(source_page.mediabox.width) + 10
+    assert (
+        float(grid_page.mediabox.height) == 2 * float(source_page.mediabox.height) + 10
+    )
+    xobjects = grid_page["/Resources"]["/XObject"]
+    assert len(xobjects) == 3
+    assert all(
+        xobject.get_object()["/Subtype"] == "/Form" for xobject in xobjects.values()
+    )
+
+
+def test_chunked_pdf_writer_matches_single_conversion():
+    pages = []
+    for index in range(5):
+        byte_io = io.BytesIO()
+        PIL.Image.new("RGB", (100 + index * 10, 200), (index * 50, 0, 0)).save(
+            byte_io, format="JPEG"
+        )
+        pages.append(byte_io.getvalue())
+    output = io.BytesIO()
+    core.write_pdf_in_chunks(output, pages, 2)
+
+    reader = pypdf.PdfReader(io.BytesIO(output.getvalue()), strict=True)
+    expected = pypdf.PdfReader(io.BytesIO(img2pdf.convert(pages)))
+    assert [page.mediabox for page in reader.pages] == [
+        page.mediabox for page in expected.pages
+    ]
+    assert [page.images[0].image.size for page in reader.pages] == [
+        (100 + index * 10, 200) for index in range(5)
+    ]
+
+
+def test_single_document_image_to_pdf_in_batches(monkeypatch):
+    workspace = os.path.join(OUTPUT_DIR, "image_pdf_test")
+    os.makedirs(workspace)
+    for index in range(5):
+        PIL.Image.new("RGB", (100 + index * 10, 80), (0, index * 50, 0)).save(
+            os.path.join(workspace, f"image_{index}.png")
+        )
+    monkeypatch.setattr(core, "IMAGE_PDF_CHUNK_FILES", 2)
+    core.image_to_pdf(workspace, single_document=True)
+
+    output_path = find_single_generated_file(workspace, "_pdf_all_")
+    reader = pypdf.PdfReader(output_path, strict=True)
+    assert [page.images[0].image.size for page in reader.pages] == [
+        (100 + index * 10, 80) for index in range(5)
+    ]
+
+
+def test_indexer_filters_depth_and_symlinks():
+    workspace = os.path.join(OUTPUT_DIR, "indexer_test")
+    for relative_path in ("a.png", "b.jpg", "skip.png", "sub/c.png", "sub/deep/d.png"):
+        file_path = os.path.join(workspace, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        open(file_path, "wb").close()
+    os.symlink(
+        os.path.abspath(os.path.join(workspace, "sub")), os.path.join(workspace, "link")
+    )
+
+    def scan(**options):
+        return [
+            os.path.relpath(entry.path, workspace)
+            for entry in indexer.scan_directory(workspace, **options)
+        ]
+
+    assert scan(extensions=["png"], exclude="skip*", max_depth=1) == [
+        "a.png",
+        os.path.join("sub", "c.png"),
+    ]
+    assert scan(include="sub/c*") == [os.path.join("sub", "c.png")]
+    assert scan(symlinks="follow", include="*/c.png") == [os.path.join("link", "c.png")]
+    assert os.path.join("link", "c.png") not in scan()
+    with pytest.raises(ValueError):
+        scan(symlinks="ignore")
+
+
+def test_batch_file_renaming_logic(monkeypatch):
     rename_workspace = os.path.join(OUTPUT_DIR, "rename_test")
     populate_directory_with_test_pdfs(rename_workspace, file_count=3)
 
-    core.input_text = "newname"
+    monkeypatch.setattr(core, "input_text", "newname")
     core.rename_files(rename_workspace)
 
     final_files = sorted(os.listdir(rename_workspace))
@@ -182,6 +380,31 @@ def test_auto_cropping_logic():
         assert 95 <= cropped_image.height <= 105
 
 
+def test_crop_edges_tolerance_references_and_alpha():
+    image = PIL.Image.new("RGB", (100, 80), (255, 255, 255))
+    image.paste((0, 0, 0), (40, 30, 60, 50))
+    image.paste((248, 248, 248), (10, 0, 20, 80))
+    assert core.find_crop_edges(image) == (40, 30, 60, 50)
+    assert core.find_crop_edges(image, tolerance=5) == (10, 0, 60, 80)
+
+    # The corner sample makes the gray band a border unless the top edge is
+    # given its own reference color
+    image = PIL.Image.new("RGB", (100, 80), (255, 255, 255))
+    image.paste((128, 128, 128), (0, 0, 100, 10))
+    image.paste((0, 0, 0), (40, 30, 60, 50))
+    assert core.find_crop_edges(image) == (0, 10, 100, 50)
+    references = {"top": (255, 255, 255)}
+    assert core.find_crop_edges(image, references=references) == (0, 0, 100, 50)
+
+    # Fully transparent pixels are trimmed whatever color they store
+    image = PIL.Image.new("RGBA", (100, 80), (0, 0, 0, 0))
+    image.paste((255, 255, 255, 0), (0, 60, 100, 70))
+    image.paste((255, 0, 0, 255), (40, 30, 60, 50))
+    assert core.find_crop_edges(image) == (40, 30, 60, 50)
+    image.paste((255, 0, 0, 40), (70, 30, 80, 40))
+    assert core.find_crop_edges(image) == (40, 30, 80, 50)
+
+
 def test_svg_and_webp_conversion():
     workspace = os.path.join(OUTPUT_DIR, "svg_webp_test")
     os.makedirs(workspace, exist_ok=True)
@@ -198,7 +421,72 @@ def test_svg_and_webp_conversion():
     assert os.path.getsize(png_output_path) > 0
 
 
-def test_duplicate_detection_logic():
+def test_svg_renderer_pool_size_and_width_options(monkeypatch):
+    workspace = os.path.join(OUTPUT_DIR, "svg_options_test")
+    os.makedirs(workspace)
+    svg_path = os.path.join(workspace, "icon.svg")
+    with open(svg_path, "w") as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"/>')
+
+    pools = []
+
+    def record_pool(func, file_paths, *args, workers=None, **kwargs):
+        if func is core.render_svg_file:
+            pools.append((list(file_paths), args, workers, kwargs["initargs"]))
+        return []
+
+    monkeypatch.setattr(core, "process_files", record_pool)
+    monkeypatch.setattr(core, "max_workers", 8)
+    monkeypatch.setattr(core, "input_text", "2 640px")
+    monkeypatch.setattr(core, "playwright", None)
+    core.convert_svg_and_webp_to_png(workspace)
+    monkeypatch.setattr(core, "playwright", object())
+    core.convert_svg_and_webp_to_png(workspace)
+    core.convert_svg_and_webp_to_png(workspace, scale=3, renderers=2)
+    assert pools == [
+        ([svg_path], (2.0, 640), 8, (2.0,)),
+        ([svg_path], (2.0, 640), 4, (2.0,)),
+        ([svg_path], (3, 640), 2, (3,)),
+    ]
+
+    # A fixed width overrides the scale in cairosvg
+    svg2png_calls = []
+    fake_cairosvg = type(
+        "FakeCairoSvg", (), {"svg2png": lambda **kwargs: svg2png_calls.append(kwargs)}
+    )
+    monkeypatch.setattr(core, "get_cairosvg", lambda: fake_cairosvg)
+    core.render_svg_file(svg_path, 2, 640)
+    core.render_svg_file(svg_path, 2)
+    assert [(call["scale"], call["output_width"]) for call in svg2png_calls] == [
+        (1, 640),
+        (2, None),
+    ]
+
+    # The browser page already renders at the scale factor
+    class FakeLocator:
+        first = property(lambda self: self)
+
+        def evaluate(self, script, width):
+            widths.append(width)
+
+        def screenshot(self, path, omit_background):
+            screenshots.append(path)
+
+    class FakePage:
+        def goto(self, url):
+            pass
+
+        def locator(self, selector):
+            return FakeLocator()
+
+    widths, screenshots = [], []
+    monkeypatch.setattr(core, "svg_renderer", (None, None, FakePage()))
+    assert core.render_svg_file(svg_path, 2, 640) == [f"{svg_path[:-4]}.png"]
+    assert widths == [320] and len(screenshots) == 1
+    assert len(svg2png_calls) == 2
+
+
+def test_duplicate_detection_logic(status):
     workspace = os.path.join(OUTPUT_DIR, "duplicate_test")
     os.makedirs(workspace, exist_ok=True)
 
@@ -213,76 +501,538 @@ def test_duplicate_detection_logic():
     unique_file = os.path.join(workspace, "unique.txt")
     with open(unique_file, "wb") as f:
         f.write(b"completely different content")
+    for control_name in (core.JOURNAL_NAME, f"{core.CONTROL_PREFIX}tmp_1.txt"):
+        with open(os.path.join(workspace, control_name), "wb") as f:
+            f.write(identical_content)
+
+    core.duplicate_detector(workspace)
+    assert "Duplicate files found" in status.captured_text
+    assert "file1.txt" in status.captured_text
+    assert "file2.txt" in status.captured_text
+    assert "unique.txt" not in status.captured_text
+    assert core.CONTROL_PREFIX not in status.captured_text
+
+
+def test_duplicate_detector_hashes_in_tiers_and_caches_digests(monkeypatch, status):
+    workspace = os.path.join(OUTPUT_DIR, "duplicate_tiers_test")
+    os.makedirs(workspace)
+    size = 4 * core.PARTIAL_HASH_BYTES
+    contents = {
+        "a.bin": b"a" * size,
+        "b.bin": b"a" * size,
+        # Same edges as a.bin, so only the full hash tells them apart
+        "c.bin": b"a" * (size // 2) + b"c" + b"a" * (size // 2 - 1),
+        "d.bin": b"d" + b"a" * (size - 1),
+        "e.bin": b"a" * (size + 1),
+    }
+    for name, content in contents.items():
+        with open(os.path.join(workspace, name), "wb") as f:
+            f.write(content)
+
+    hashed = {"edges": [], "full": []}
+
+    def record(tier, func):
+        def wrapper(path):
+            hashed[tier].append(os.path.basename(path))
+            return func(path)
+
+        return wrapper
+
+    monkeypatch.setattr(core, "hash_file_edges", record("edges", core.hash_file_edges))
+    monkeypatch.setattr(core, "hash_file", record("full", core.hash_file))
+    core.duplicate_detector(workspace)
+    assert sorted(hashed["edges"]) == ["a.bin", "b.bin", "c.bin", "d.bin"]
+    assert sorted(hashed["full"]) == ["a.bin", "b.bin", "c.bin"]
+    report = status.captured_text
+    assert report.count("Duplicate:") == 1 and "b.bin" in report
+
+    hashed["full"].clear()
+    core.duplicate_detector(workspace)
+    assert hashed["full"] == []
+    assert status.captured_text == report
+
+    os.utime(os.path.join(workspace, "c.bin"), ns=(0, 0))
+    core.duplicate_detector(workspace)
+    assert hashed["full"] == ["c.bin"]
+
+
+def test_parallel_batch_reports_results_in_order(monkeypatch, status):
+    workspace = os.path.join(OUTPUT_DIR, "batch_test")
+    os.makedirs(workspace, exist_ok=True)
 
-    class StatusCapturer:
-        def __init__(self):
-            self.captured_text = ""
+    for index in range(1, 6):
+        PIL.Image.new("RGB", (100, 100), (index * 40, 0, 0)).save(
+            os.path.join(workspace, f"image_{index}.png")
+        )
+    with open(os.path.join(workspace, "image_3.jpg"), "wb") as broken_file:
+        broken_file.write(b"not an image")
+
+    monkeypatch.setattr(core, "max_workers", 4)
+    core.crop_by_90(workspace)
+    lines = status.captured_text.split("\n")
+    assert len(lines) == 6
+    assert lines[2].startswith("Failed:") and "image_3.jpg" in lines[2]
+    created = [line for line in lines if line.startswith("Created:")]
+    assert created == sorted(created)
+    with PIL.Image.open(
+        os.path.join(workspace, "_crop90_image_1.png")
+    ) as cropped_image:
+        assert cropped_image.size == (90, 90)
+
+
+def test_near_duplicate_image_clustering(status):
+    workspace = os.path.join(OUTPUT_DIR, "near_duplicate_test")
+    os.makedirs(workspace, exist_ok=True)
 
-        def setText(self, text):
-            self.captured_text = text
+    gradient = PIL.Image.linear_gradient("L").convert("RGB")
+    gradient.save(os.path.join(workspace, "gradient.png"))
+    gradient.resize((128, 128)).save(os.path.join(workspace, "gradient_small.jpg"))
+    gradient.rotate(90).save(os.path.join(workspace, "rotated.png"))
 
-    capturer = StatusCapturer()
-    original_status_field = core.status_field
-    core.status_field = capturer
+    core.near_duplicate_detector(workspace, threshold=4)
+    assert "Cluster 1:" in status.captured_text
+    assert "Cluster 2:" not in status.captured_text
+    assert "gradient.png" in status.captured_text
+    assert "gradient_small.jpg" in status.captured_text
+    assert "rotated.png" not in status.captured_text
+
+
+def test_image_merging_layouts_on_one_canvas():
+    workspace = os.path.join(OUTPUT_DIR, "merge_images_test")
+    os.makedirs(workspace, exist_ok=True)
+    PIL.Image.new("RGB", (100, 50), (255, 0, 0)).save(os.path.join(workspace, "a.png"))
+    PIL.Image.new("RGB", (50, 50), (0, 0, 255)).save(os.path.join(workspace, "b.png"))
+
+    core.merge_images(
+        workspace, layouts=["vertical", "grid"], columns=2, spacing=10, formats=("png",)
+    )
 
+    with PIL.Image.open(os.path.join(workspace, "_v_merge.png")) as merged:
+        assert merged.size == (100, 160)
+        assert merged.getpixel((50, 25)) == (255, 0, 0)
+        assert merged.getpixel((50, 55)) == (255, 255, 255)
+        assert merged.getpixel((50, 110)) == (0, 0, 255)
+    with PIL.Image.open(os.path.join(workspace, "_g_merge.png")) as merged:
+        assert merged.size == (210, 50)
+        assert merged.getpixel((50, 25)) == (255, 0, 0)
+        assert merged.getpixel((120, 25)) == (255, 255, 255)
+        assert merged.getpixel((160, 25)) == (0, 0, 255)
+
+
+def test_file_info_report_and_export(status):
+    workspace = os.path.join(OUTPUT_DIR, "info_test")
+    os.makedirs(workspace, exist_ok=True)
+    PIL.Image.new("RGB", (120, 80)).save(os.path.join(workspace, "image.png"))
+    create_composite_pdf(os.path.join(workspace, "document.pdf"), [1, 2, 3])
+
+    core.print_info(workspace)
+
+    assert "Images: 1" in status.captured_text
+    assert "PDFs: 1 (3 pages)" in status.captured_text
+    with open(os.path.join(workspace, "_info.jsonl")) as jsonl_file:
+        rows = {
+            os.path.basename(row["file"]): row
+            for row in map(core.json.loads, jsonl_file)
+        }
+    assert rows.keys() == {"image.png", "document.pdf"}
+    assert (rows["image.png"]["width"], rows["image.png"]["height"]) == (120, 80)
+    assert rows["image.png"]["format"] == "PNG"
+    assert rows["document.pdf"]["pages"] == 3
+    assert rows["document.pdf"]["encrypted"] is False
+    with open(os.path.join(workspace, "_info.csv"), newline="") as csv_file:
+        csv_rows = list(core.csv.DictReader(csv_file))
+    assert sorted(row["pages"] for row in csv_rows) == ["", "3"]
+
+
+def test_image_color_report_and_export():
+    workspace = os.path.join(OUTPUT_DIR, "color_test")
+    os.makedirs(workspace, exist_ok=True)
+
+    image = PIL.Image.new("RGBA", (100, 100), (255, 0, 0, 255))
+    image.paste((0, 0, 255, 255), (0, 0, 100, 25))
+    image.paste((0, 255, 0, 0), (0, 75, 100, 100))
+    image.save(os.path.join(workspace, "colors.png"))
+
+    core.get_image_colors(workspace, palette_size=2)
+
+    with open(os.path.join(workspace, "_colors.json")) as json_file:
+        rows = core.json.load(json_file)
+    assert len(rows) == 1
+    assert rows[0]["pixels"] == 7500
+    assert rows[0]["common"] == [["#ff0000", 5000], ["#0000ff", 2500]]
+    assert rows[0]["average"] == "#aa0055"
+    assert [color for color, _ in rows[0]["palette"]] == ["#ff0000", "#0000ff"]
+    assert os.path.exists(os.path.join(workspace, "_colors.csv"))
+
+
+def test_incremental_runs_skip_unchanged_inputs():
+    workspace = os.path.join(OUTPUT_DIR, "incremental_test")
+    os.makedirs(workspace, exist_ok=True)
+
+    for index in range(3):
+        PIL.Image.new("RGB", (100, 100), (index * 50, 0, 0)).save(
+            os.path.join(workspace, f"image_{index}.png")
+        )
+    core.crop_by_90(workspace)
+    first_run_files = sorted(os.listdir(workspace))
+
+    os.remove(os.path.join(workspace, "_crop90_image_2.png"))
+    crop_output = os.path.join(workspace, "_crop90_image_0.png")
+    output_mtime = os.path.getmtime(crop_output)
+    core.crop_by_90(workspace)
+
+    assert sorted(os.listdir(workspace)) == first_run_files
+    assert os.path.getmtime(crop_output) == output_mtime
+    assert not any(name.startswith("_crop90__crop90_") for name in first_run_files)
+
+
+def test_resave_recompresses_and_skips_unchanged_files(monkeypatch, status):
+    workspace = os.path.join(OUTPUT_DIR, "resave_test")
+    os.makedirs(workspace, exist_ok=True)
+    photo_path = os.path.join(workspace, "photo.jpg")
+    PIL.Image.effect_noise((200, 200), 64).convert("RGB").save(photo_path, quality=95)
+    original_size = os.path.getsize(photo_path)
+
+    monkeypatch.setattr(core, "input_text", "q50")
+    core.resave_files(workspace)
+    assert status.captured_text.startswith(photo_path)
+    assert os.path.getsize(photo_path) < original_size
+    assert sorted(os.listdir(workspace)) == sorted([core.MANIFEST_NAME, "photo.jpg"])
+
+    resaved_mtime = os.path.getmtime(photo_path)
+    core.resave_files(workspace)
+    assert status.captured_text == "Skipped 1 unchanged file(s)."
+    assert os.path.getmtime(photo_path) == resaved_mtime
+
+
+def test_resave_only_reencodes_pdf_images_over_the_dpi_cap():
+    workspace = os.path.join(OUTPUT_DIR, "resave_dpi_test")
+    os.makedirs(workspace, exist_ok=True)
+    scan = io.BytesIO()
+    noise = PIL.Image.effect_noise((200, 200), 40).convert("RGB")
+    noise.save(scan, "PNG", dpi=(35, 35))
+    pdf_path = os.path.join(workspace, "scan.pdf")
+    with open(pdf_path, "wb") as pdf_file:
+        pdf_file.write(img2pdf.convert(scan.getvalue()))
+    original_size = os.path.getsize(pdf_path)
+
+    def get_image_filter():
+        page = pypdf.PdfReader(pdf_path).pages[0]
+        return page["/Resources"]["/XObject"]["/Im0"]["/Filter"]
+
+    core.resave_file(pdf_path, max_dpi=600)
+    assert get_image_filter() == "/FlateDecode"
+    assert os.path.getsize(pdf_path) <= original_size
+
+    core.resave_file(pdf_path, max_dpi=10)
+    assert get_image_filter() == "/DCTDecode"
+    assert pypdf.PdfReader(pdf_path).pages[0].images[0].image.size == (57, 57)
+
+
+def test_in_memory_pipeline_writes_only_final_outputs():
+    workspace = os.path.join(OUTPUT_DIR, "pipeline_test")
+    os.makedirs(workspace, exist_ok=True)
+
+    for index in range(2):
+        image = PIL.Image.new("RGB", (200, 200), (255, 255, 255))
+        image.paste((40 * index, 0, 0), (50, 50, 150, 150))
+        image.save(os.path.join(workspace, f"scan_{index}.png"))
+
+    pipeline.run_pipeline(
+        workspace, "crop_solid_edges tolerance=5 | crop_by_90 | images"
+    )
+    outputs = sorted(name for name in os.listdir(workspace) if name.endswith(".png"))
+    assert outputs == [
+        "_pipe_scan_0.png",
+        "_pipe_scan_1.png",
+        "scan_0.png",
+        "scan_1.png",
+    ]
+    with PIL.Image.open(os.path.join(workspace, "_pipe_scan_0.png")) as image:
+        assert image.size == (90, 90)
+
+    pipeline.run_pipeline(workspace, "grayscale | contrast factor=1.5 | pdf")
+    pdf_paths = sorted(name for name in os.listdir(workspace) if name.endswith(".pdf"))
+    assert pdf_paths == ["_pipe_scan_0.pdf", "_pipe_scan_1.pdf"]
+
+    with pytest.raises(ValueError):
+        pipeline.load_pipeline("crop_by_90 | resize")
+    with pytest.raises(ZeroDivisionError):
+        list(pipeline.run_stages([(1, 1), (2, 0)], [lambda value: 1 / value], 1))
+
+
+def test_operation_events_report_phases_and_bytes():
+    workspace = os.path.join(OUTPUT_DIR, "instrumentation_test")
+    os.makedirs(workspace, exist_ok=True)
+    for index in range(2):
+        PIL.Image.new("RGB", (100, 100), (index * 90, 0, 0)).save(
+            os.path.join(workspace, f"image_{index}.png")
+        )
+
+    events = []
+    instrumentation.add_listener(events.append)
     try:
-        core.duplicate_detector(workspace)
-        assert "Duplicate files found" in capturer.captured_text
-        assert "file1.txt" in capturer.captured_text
-        assert "file2.txt" in capturer.captured_text
-        assert "unique.txt" not in capturer.captured_text
+        core.crop_by_90(workspace)
     finally:
-        core.status_field = original_status_field
+        instrumentation.remove_listener(events.append)
+
+    assert [event["event"] for event in events] == [
+        "operation_start",
+        "file",
+        "file",
+        "files_total",
+        "operation_end",
+    ]
+    assert events[3]["total"] == 2
+    file_event, operation_event = events[1], events[-1]
+    assert file_event["operation"] == "crop_by_90"
+    assert {"decode", "transform", "encode"} <= set(file_event["phases"])
+    assert file_event["bytes_read"] == os.path.getsize(file_event["file"])
+    assert operation_event["files"] == 2 and operation_event["failed"] == 0
+    assert operation_event["bytes_written"] == sum(
+        os.path.getsize(os.path.join(workspace, f"_crop90_image_{index}.png"))
+        for index in range(2)
+    )
 
 
-def test_pdf_encryption_and_decryption():
-    workspace = os.path.join(OUTPUT_DIR, "encryption_test")
+def test_cancelled_batch_stops_between_files():
+    workspace = os.path.join(OUTPUT_DIR, "cancel_test")
     os.makedirs(workspace, exist_ok=True)
+    for index in range(4):
+        PIL.Image.new("RGB", (100, 100), (index * 50, 0, 0)).save(
+            os.path.join(workspace, f"image_{index}.png")
+        )
 
-    target_pdf_path = os.path.join(workspace, "source.pdf")
-    create_composite_pdf(target_pdf_path, [1])
+    def cancel_after_first_file(event):
+        if event["event"] == "file":
+            core.cancel_event.set()
 
-    test_password = "secure_test_password"
-    core.input_text = test_password
-    core.encrypt_pdf(workspace)
+    instrumentation.add_listener(cancel_after_first_file)
+    try:
+        core.crop_by_90(workspace)
+    finally:
+        instrumentation.remove_listener(cancel_after_first_file)
+        core.cancel_event.clear()
+
+    outputs = [name for name in os.listdir(workspace) if name.startswith("_crop90_")]
+    assert 1 <= len(outputs) < 4
+    core.crop_by_90(workspace)
+    outputs = [name for name in os.listdir(workspace) if name.startswith("_crop90_")]
+    assert len(outputs) == 4
+
+
+def test_page_cache_evicts_least_recently_used_pages(monkeypatch):
+    workspace = os.path.join(OUTPUT_DIR, "page_cache_test")
+    os.makedirs(workspace)
+    monkeypatch.setattr(core, "page_cache_memory_mb", 1)
+    monkeypatch.setattr(core, "page_cache_disk_mb", 1)
+    os.makedirs(core.PAGE_CACHE_DIR)
+    # 300 x 300 RGB pages take 270 KB, so three fit in each tier
+    keys = [("digest", page, 200, False) for page in range(1, 5)]
+    for index, key in enumerate(keys):
+        image = PIL.Image.effect_noise((300, 300), 64 + index).convert("RGB")
+        rendered_path = os.path.join(workspace, f"page_{index}.png")
+        image.save(rendered_path, compress_level=0)
+        core.put_memory_page(key, image)
+        assert core.put_disk_page(key, rendered_path) == core.get_page_cache_path(key)
+        os.utime(core.get_page_cache_path(key), (index, index))
+        if index == 2:
+            assert core.get_memory_page(keys[0]) is not None
+            core.get_disk_page(keys[0])
+    core.trim_page_cache()
+
+    assert core.get_memory_page(keys[1]) is None
+    assert all(core.get_memory_page(key) is not None for key in keys[::2])
+    assert core.get_disk_page(keys[1]) is None
+    assert core.get_disk_page(keys[0]) is not None
+
+
+def get_page_cache_sizes(file_path):
+    return file_path, core.page_cache_memory_mb, core.page_cache_disk_mb
+
+
+def test_pool_workers_receive_page_cache_sizes(monkeypatch):
+    monkeypatch.setattr(core, "page_cache_memory_mb", 7)
+    monkeypatch.setattr(core, "page_cache_disk_mb", 9)
+    # Spawned workers re-import core and would otherwise see the defaults
+    monkeypatch.setattr(
+        concurrent.futures,
+        "ProcessPoolExecutor",
+        functools.partial(
+            concurrent.futures.ProcessPoolExecutor,
+            mp_context=multiprocessing.get_context("spawn"),
+        ),
+    )
+    results = core.process_files(get_page_cache_sizes, ["a", "b"], workers=2)
+    assert [result for _, result, _ in results] == [("a", 7, 9), ("b", 7, 9)]
 
-    encrypted_pdf_path = find_single_generated_file(workspace, "_encrypted_")
 
-    reader = core.pypdf.PdfReader(encrypted_pdf_path)
-    assert reader.is_encrypted
-    assert reader.decrypt(test_password)
+def write_text_pdf(pdf_path, page_texts):
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    writer = pypdf.PdfWriter()
+    for text in page_texts:
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 24 Tf 72 720 Td ({text}) Tj ET".encode())
+        page.replace_contents(content)
+    writer.write(pdf_path)
+
+
+def test_text_index_searches_pages_and_updates_incrementally(status):
+    workspace = os.path.join(OUTPUT_DIR, "search_test")
+    shutil.rmtree(workspace, ignore_errors=True)
+    os.makedirs(workspace)
+    report = os.path.join(workspace, "report.pdf")
+    write_text_pdf(report, ["summary", "invoice total", "invoice due date", "notes"])
+    write_text_pdf(os.path.join(workspace, "letter.pdf"), ["dear reader"])
+    core.index_pdf_text(workspace)
+
+    assert core.search_pdf_text(workspace, "invoice") == {report: [2, 3]}
+    assert core.search_pdf_text(workspace, "due date") == {report: [3]}
+    assert core.search_pdf_text(workspace, "(unbalanced") == {}
+
+    write_text_pdf(os.path.join(workspace, "letter.pdf"), ["overdue invoice"])
+    core.index_pdf_text(workspace)
+    assert status.captured_text == "Indexed 1 PDFs (1 pages), 1 unchanged, 0 removed."
+    matches = core.search_pdf_text(workspace, "invoice")
+    assert list(matches.values()) == [[1], [2, 3]]
+
+    core.save_page_range(workspace, ranges="search:invoice")
+    outputs = sorted(
+        name for name in os.listdir(workspace) if name.startswith("_range_")
+    )
+    assert outputs == ["_range_01-01_letter.pdf", "_range_02-03_report.pdf"]
 
 
-if __name__ == "__main__":
+def test_interrupted_job_resumes_from_journal():
+    workspace = os.path.join(OUTPUT_DIR, "resume_test")
+    os.makedirs(workspace, exist_ok=True)
+    for index in range(6):
+        PIL.Image.new("RGB", (100, 100), (index * 40, 0, 0)).save(
+            os.path.join(workspace, f"image_{index}.png")
+        )
+
+    def interrupt(event):
+        if event["event"] == "file" and event["file"].endswith("image_3.png"):
+            raise KeyboardInterrupt
+
+    instrumentation.add_listener(interrupt)
     try:
-        print("Running: test_pdf_merging_and_ocr_verification...")
-        test_pdf_merging_and_ocr_verification()
+        with pytest.raises(KeyboardInterrupt):
+            core.crop_by_90(workspace)
+    finally:
+        instrumentation.remove_listener(interrupt)
+    assert os.path.exists(os.path.join(workspace, core.JOB_NAME))
+    assert os.path.exists(os.path.join(workspace, core.JOURNAL_NAME))
 
-        print("Running: test_pdf_page_range_extraction_variants...")
-        test_pdf_page_range_extraction_variants("2-4", ["2", "3", "4"])
+    events = []
+    instrumentation.add_listener(events.append)
+    try:
+        core.resume_job(workspace)
+    finally:
+        instrumentation.remove_listener(events.append)
+    resumed = [
+        os.path.basename(event["file"]) for event in events if event["event"] == "file"
+    ]
+    assert resumed == ["image_3.png", "image_4.png", "image_5.png"]
+    assert (
+        len([name for name in os.listdir(workspace) if name.startswith("_crop90_")])
+        == 6
+    )
+    assert not os.path.exists(os.path.join(workspace, core.JOB_NAME))
+    assert not os.path.exists(os.path.join(workspace, core.JOURNAL_NAME))
 
-        print("Running: test_pdf_stitching_functionality...")
-        test_pdf_stitching_functionality()
 
-        print("Running: test_batch_file_renaming_logic...")
-        test_batch_file_renaming_logic()
+@pytest.mark.parametrize(
+    "job_data",
+    [
+        '{"module": "shutil", "operation": "rmtree", "args": [], "kwargs": {}, '
+        '"input_text": ""}',
+        '{"module": "core", "operation": "crop_by_90", "args": [["a"]], '
+        '"kwargs": {}, "input_text": ""}',
+        '{"module": "core", "operation": "crop_by_90", "args": [], '
+        '"kwargs": {"unknown": 1}, "input_text": ""}',
+        '{"module": "core", "operation": "crop_by_90"',
+    ],
+)
+def test_resume_rejects_untrusted_job_files(job_data, status):
+    workspace = os.path.join(OUTPUT_DIR, "resume_reject_test")
+    shutil.rmtree(workspace, ignore_errors=True)
+    os.makedirs(workspace)
+    with open(os.path.join(workspace, core.JOB_NAME), "w") as job_file:
+        job_file.write(job_data)
+    with open(os.path.join(workspace, core.JOURNAL_NAME), "w") as journal_file:
+        journal_file.write('{"operation": "crop_by_90"}\n{"key": \n')
+
+    core.resume_job(workspace)
+    core.RunManifest(workspace, "crop_by_90")
+    assert status.captured_text.startswith("Cannot resume job:")
+    assert os.path.isdir(workspace)
+
+
+def test_cli_parses_options_and_dispatches_subcommands(monkeypatch, capsys):
+    workspace = os.path.join(OUTPUT_DIR, "cli_test")
+    os.makedirs(workspace)
+    PIL.Image.new("RGB", (100, 100), "red").save(os.path.join(workspace, "image.png"))
+    for name in ("max_workers", "page_cache_memory_mb", "page_cache_disk_mb"):
+        monkeypatch.setattr(core, name, getattr(core, name))
+    monkeypatch.setattr(instrumentation, "log_path", None)
+    monkeypatch.setattr(instrumentation, "profile_dir", None)
+
+    argv = ["--workers", "1", "--no-incremental", "--disk-cache", "64"]
+    assert cli.main([*argv, "crop-by-90", workspace]) == 0
+    assert (core.max_workers, core.incremental, core.page_cache_disk_mb) == (
+        1,
+        False,
+        64,
+    )
+    assert "_crop90_image.png" in capsys.readouterr().out
+    with PIL.Image.open(os.path.join(workspace, "_crop90_image.png")) as image:
+        assert image.size == (90, 90)
+
+    calls = []
+    monkeypatch.setattr(core, "merge_pdfs", lambda *args: calls.append(args))
+    assert cli.main(["merge-pdfs", workspace, "--pages", "10"]) == 0
+    assert calls == [(workspace, 10, None)]
+
+    assert cli.main(["crop-by-90", os.path.join(workspace, "missing")]) == 2
+    with pytest.raises(SystemExit):
+        cli.main(["encrypt-pdf", workspace])
+
+
+def test_pdf_encryption_and_decryption(monkeypatch):
+    workspace = os.path.join(OUTPUT_DIR, "encryption_test")
+    os.makedirs(workspace, exist_ok=True)
+
+    target_pdf_path = os.path.join(workspace, "source.pdf")
+    create_composite_pdf(target_pdf_path, [1])
 
-        print("Running: test_auto_cropping_logic...")
-        test_auto_cropping_logic()
+    test_password = "secure_test_password"
+    monkeypatch.setattr(core, "input_text", test_password)
+    core.encrypt_pdf(workspace)
 
-        print("Running: test_svg_and_webp_conversion...")
-        test_svg_and_webp_conversion()
+    encrypted_pdf_path = find_single_generated_file(workspace, "_encrypted_")
 
-        print("Running: test_duplicate_detection_logic...")
-        test_duplicate_detection_logic()
+    reader = core.pypdf.PdfReader(encrypted_pdf_path)
+    assert reader.is_encrypted
+    assert reader.decrypt(test_password)
 
-        print("Running: test_pdf_encryption_and_decryption...")
-        test_pdf_encryption_and_decryption()
+    monkeypatch.setattr(core, "input_text", "new_password")
+    core.encrypt_pdf(workspace)
+    assert find_single_generated_file(workspace, "_encrypted_") == encrypted_pdf_path
+    reader = core.pypdf.PdfReader(encrypted_pdf_path)
+    assert not reader.decrypt(test_password)
+    assert reader.decrypt("new_password")
 
-        print("\nAll available tests PASSED successfully!")
-    except Exception as error:
-        print(f"\nTests FAILED: {error}")
-        import traceback
 
-        traceback.print_exc()
-        sys.exit(1)
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))